@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import hashlib
+from decimal import Decimal
+from sys import argv, exit, stderr, stdout
+
+"""
+dist/result.bin 为 dist/result.txt 的二进制编码，解码后与 result.txt 逐字节一致。所有整数均为 LEB128 varint，
+可能为负的整数先做 zigzag 变换；字符串以字符串表下标表示。依次为：
+- 魔数 b"OIDB" 与版本；
+- 字符串表：字符串个数，之后每个字符串为 UTF-8 字节数与字节；
+- OIer 数，之后每名 OIer 为 uid、姓名首字母、姓名、性别*、初中入学年份*、DB 评分*、CCF 评分*、CCF 评级与记录数，
+  评分以 0.01 为单位；
+- 每条记录为比赛 ID 与上一条记录的比赛 ID 之差*（第一条记录与 0 之差）、学校 ID 加 1（缺失时为 0）、
+  分数（字符串，空分数为空串）、
+  排名、省份与奖项（编号 n 记为 2n，无法编号时原样保留，记为字符串下标 2k + 1）、入学年份标记（0 为无，
+  1 为 ':'，2 为 ';'），有标记时后接入学年份*。
+标 * 者为 zigzag 变换后的整数。
+
+本模块中的解码部分不依赖其他模块，可直接复制使用。
+"""
+__magic__ = b"OIDB"
+__version__ = 2
+__ems_marks__ = ["", ":", ";"]
+
+
+def __put__(buffer, value):
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def __put_signed__(buffer, value):
+    __put__(buffer, value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+def __format_hundredths__(value):
+    "同 OIer.__float2p_format__，参数以 0.01 为单位。"
+
+    text = f"{'-' if value < 0 else ''}{abs(value) // 100}.{abs(value) % 100:02d}"
+    return text.rstrip("0").rstrip(".").lstrip("0") or "0"
+
+
+class BinaryResultWriter:
+    """将 result.txt 的各行编码为二进制格式，关闭时写入文件。
+
+    字符串表须写在 OIer 之前，因此 OIer 部分先编码到内存中（约为文本大小的一半），最后一次写出。"""
+
+    def __init__(self, path, variants=()):
+        self.path = path
+        self.variants = variants
+        self.strings, self.string_ids = [], {}
+        self.body = bytearray()
+        self.count = 0
+
+    def __string__(self, text):
+        idx = self.string_ids.get(text)
+        if idx is None:
+            idx = self.string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return idx
+
+    def __code__(self, text):
+        # 省份与奖项编号为不超过 3 位的非负整数，其余（未知名称）原样保留
+        if text.isdigit() and len(text) <= 3 and str(int(text)) == text:
+            return int(text) << 1
+        return self.__string__(text) << 1 | 1
+
+    def __hundredths__(self, text):
+        value = int(Decimal(text) * 100)
+        if __format_hundredths__(value) != text:
+            raise ValueError(f"无法编码的评分：\x1b[32m'{text}'\x1b[0m")
+        return value
+
+    def write(self, oier, line):
+        """编码一行。
+
+        oier: 该行对应的 OIer，未使用。
+        line: result.txt 中以换行符结尾的一行。
+        """
+
+        body = self.body
+        uid, initials, name, gender, em, oierdb_score, ccf_score, ccf_level, records = line[:-1].split(",", 8)
+        __put__(body, int(uid))
+        __put__(body, self.__string__(initials))
+        __put__(body, self.__string__(name))
+        __put_signed__(body, int(gender))
+        __put_signed__(body, int(em))
+        __put_signed__(body, self.__hundredths__(oierdb_score))
+        __put_signed__(body, self.__hundredths__(ccf_score))
+        __put__(body, int(ccf_level))
+        records = records.split("/")
+        __put__(body, len(records))
+        previous = 0
+        for record in records:
+            mark = 2 if ";" in record else 0
+            if mark:
+                record, year = record.split(";")
+            contest, school, score, rank, province, level, *year_ = record.split(":")
+            if year_:
+                mark, year = 1, year_[0]
+            __put_signed__(body, int(contest) - previous)
+            previous = int(contest)
+            __put__(body, int(school) + 1 if school else 0)
+            __put__(body, self.__string__(score))
+            __put__(body, int(rank))
+            __put__(body, self.__code__(province))
+            __put__(body, self.__code__(level))
+            __put__(body, mark)
+            if mark:
+                __put_signed__(body, int(year))
+        self.count += 1
+
+    def encode(self):
+        "返回已写入各行的完整编码（bytes）。"
+
+        header = bytearray(__magic__)
+        __put__(header, __version__)
+        __put__(header, len(self.strings))
+        for text in self.strings:
+            data = text.encode("utf-8")
+            __put__(header, len(data))
+            header += data
+        __put__(header, self.count)
+        return bytes(header + self.body)
+
+    def close(self):
+        "写入文件。"
+
+        from sink import open_artifact  # 在此导入，使解码部分不依赖其他模块
+
+        with open_artifact(self.path, binary=True, variants=self.variants) as f:
+            f.write(self.encode())
+
+
+class __Reader__:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def get(self):
+        data, pos = self.data, self.pos
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                self.pos = pos
+                return value
+            shift += 7
+
+    def get_signed(self):
+        value = self.get()
+        return -((value + 1) >> 1) if value & 1 else value >> 1
+
+
+def decode(data):
+    """解码二进制格式。
+
+    data: 文件内容（bytes）。
+
+    返回值: 生成器，依次给出各 OIer 的
+    (uid, 姓名首字母, 姓名, 性别, 初中入学年份, DB 评分, CCF 评分, CCF 评级, 记录列表)，评分以 0.01 为单位；
+    每条记录为 (比赛 ID, 学校 ID, 分数, 排名, 省份, 奖项, 入学年份标记, 入学年份)，
+    学校 ID 缺失时为空串，分数为字符串，省份与奖项为编号（整数）或名称（字符串），无入学年份标记时入学年份为 None。
+    """
+
+    if data[:4] != __magic__:
+        raise ValueError("不是 result.bin 文件")
+    reader = __Reader__(data)
+    reader.pos = 4
+    if (version := reader.get()) != __version__:
+        raise ValueError(f"不支持的版本：{version}")
+    strings = []
+    for _ in range(reader.get()):
+        size = reader.get()
+        strings.append(bytes(data[reader.pos : reader.pos + size]).decode("utf-8"))
+        reader.pos += size
+    get, get_signed = reader.get, reader.get_signed
+
+    def code():
+        value = get()
+        return strings[value >> 1] if value & 1 else value >> 1
+
+    for _ in range(get()):
+        oier = [get(), strings[get()], strings[get()]]
+        oier += [get_signed(), get_signed(), get_signed(), get_signed(), get()]
+        records = []
+        contest = 0
+        for _ in range(get()):
+            contest += get_signed()
+            school = get() - 1
+            score, rank, province, level, mark = strings[get()], get(), code(), code(), get()
+            if school < 0:
+                school = ""
+            year = get_signed() if mark else None
+            records.append((contest, school, score, rank, province, level, mark, year))
+        oier.append(records)
+        yield tuple(oier)
+
+
+def format_line(oier):
+    """将 decode 给出的一名 OIer 还原为 result.txt 中的一行（不含换行符）。
+
+    oier: decode 给出的 OIer。
+    """
+
+    uid, initials, name, gender, em, oierdb_score, ccf_score, ccf_level, records = oier
+
+    def record_text(contest, school, score, rank, province, level, mark, year):
+        text = f"{contest}:{school}:{score}:{rank}:{province}:{level}"
+        return f"{text}{__ems_marks__[mark]}{year}" if mark else text
+
+    records = "/".join(record_text(*record) for record in records)
+    return "{},{},{},{},{},{},{},{},{}".format(
+        uid,
+        initials,
+        name,
+        gender,
+        em,
+        __format_hundredths__(oierdb_score),
+        __format_hundredths__(ccf_score),
+        ccf_level,
+        records,
+    )
+
+
+def verify(path, sha512):
+    """解码二进制文件并检查还原出的文本是否与 result.txt 一致。
+
+    path: 二进制文件路径。
+    sha512: result.txt 的 SHA-512 摘要（十六进制）。
+
+    返回值: 是否一致。
+    """
+
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha512()
+    for oier in decode(data):
+        digest.update((format_line(oier) + "\n").encode("utf-8"))
+    return digest.hexdigest() == sha512
+
+
+__self_test_lines__ = [
+    "0,zs,张三,1,2008,0,0,0,1:5::12:3:1",  # 空分数
+    "1,zoe,Zoë·李,-1,2007,517.58,12.5,7,2:::3:5:2;2007/10:8:100:1:4:0:2006",  # 缺失学校，两种入学年份标记
+    "2,a,阿卜杜拉·艾合买提,0,-1,-3.2,0,0,7:0:0:0:北京:金牌/3:300:95.5:2:10:一等奖",  # 无法编号的省份与奖项
+]
+
+
+def self_test():
+    """将若干构造的行编码后再解码，检查还原出的文本是否与原文一致，不读写任何文件。
+
+    返回值: 不一致的 (原文, 还原结果) 列表，全部一致时为空。
+    """
+
+    writer = BinaryResultWriter(None)
+    for line in __self_test_lines__:
+        writer.write(None, line + "\n")
+    decoded = [format_line(oier) for oier in decode(writer.encode())]
+    decoded += [None] * (len(__self_test_lines__) - len(decoded))
+    return [(line, result) for line, result in zip(__self_test_lines__, decoded) if line != result]
+
+
+def main():
+    """用法: python binary.py <result.bin> [result.txt]
+       python binary.py --self-test
+
+    只给出二进制文件时，将其还原为文本输出到标准输出；同时给出 result.txt 时，检查两者是否一致。
+    --self-test 用构造的数据（空分数、缺失学校、非 ASCII 姓名等）检查编码与解码能否互逆。
+    """
+
+    if "--self-test" in argv:
+        mismatches = self_test()
+        for line, result in mismatches:
+            print(f"\x1b[01;31mmismatch: \x1b[0m\x1b[32m'{line}'\x1b[0m → \x1b[35m'{result}'\x1b[0m", file=stderr)
+        print("MISMATCH" if mismatches else "OK")
+        exit(1 if mismatches else 0)
+    if len(argv) < 2:
+        print(main.__doc__, file=stderr)
+        exit(1)
+    if len(argv) >= 3:
+        with open(argv[2], "rb") as f:
+            ok = verify(argv[1], hashlib.sha512(f.read()).hexdigest())
+        print("OK" if ok else "MISMATCH")
+        exit(0 if ok else 1)
+    with open(argv[1], "rb") as f:
+        data = f.read()
+    for oier in decode(data):
+        stdout.write(format_line(oier) + "\n")
+
+
+if __name__ == "__main__":
+    main()
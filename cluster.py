@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+from collections import Counter
+from contest import Contest
+from functools import reduce
+from operator import or_
+from record import __contest_type_map__, __grades_range__, __school_penalty__
+from school import School
+from time import perf_counter_ns
+import util
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__stage_of_grades__ = {grades: stage for stage, li in __grades_range__.items() for grades in li}
+__junior_first__ = __grades_range__["junior"][0]
+__senior_first__ = __grades_range__["senior"][0]
+__senior_last__ = __grades_range__["senior"][2]
+__numpy_threshold__ = 512  # 记录数不少于该值的同名组使用 NumPy 计算冲突矩阵
+
+
+def __crossed__(P, Q):
+    "判断是否存在 p ∈ P、q ∈ Q 使得 p != q。"
+
+    return bool(P) and bool(Q) and len(P | Q) > 1
+
+
+def __union__(masks):
+    return reduce(or_, masks, 0)
+
+
+class RecordColumns:
+    """一组记录中合并所需各字段的列，第 i 个元素对应 records 中的第 i 条记录。
+
+    records 为 Record 列表，或给出 table 时为 RecordTable 的行号列表（见 record_table.py），
+    后者直接读取表中的各列，不为每条记录创建对象。"""
+
+    def __init__(self, records, table=None):
+        self.records = records
+        if table is None:
+            self.contests = [record.contest for record in records]
+            self.schools = [record.school for record in records]
+            self.grades = [record.grades for record in records]
+            self.provinces = [record.province for record in records]
+            self.genders = [record.gender for record in records]
+        else:
+            contests, schools = Contest.get_all(), School.get_all()
+            self.contests = [contests[table.contest[idx]] for idx in records]
+            self.schools = [schools[table.school[idx]] for idx in records]
+            self.grades = [table.grades[idx] for idx in records]
+            self.provinces = [table.provinces[table.province[idx]] for idx in records]
+            self.genders = [table.gender[idx] for idx in records]
+        self.ems = [util.enrollment_middle(c, g) for c, g in zip(self.contests, self.grades)]
+        self.ems_masks = [util.enrollment_mask(c, g) for c, g in zip(self.contests, self.grades)]
+
+    def __len__(self):
+        return len(self.records)
+
+
+class Cluster:
+    """记录组的摘要，合并时增量维护 Record.distance 与 Record.check_stay_down 所需的各项统计量，
+    使距离计算不再需要遍历两个记录组中的所有记录对。
+
+    columns 为记录所在组的 RecordColumns，idx 为记录在组内的下标，records 中保存的是 columns.records 中的元素。
+    members 与 blocks 为冲突位集（见 conflict_masks），blocks & 另一记录组的 members 非零时二者一定无法合并；
+    Record.distance 中的硬性规则均已由冲突位集覆盖，因此记录组不再维护这些规则所需的统计量。"""
+
+    def __init__(self, columns, idx, members, blocks):
+        grades, school, province = columns.grades[idx], columns.schools[idx], columns.provinces[idx]
+        stage = __stage_of_grades__.get(grades)
+        self.records = [columns.records[idx]]
+        self.members = members
+        self.blocks = blocks
+        self.junior_first_provinces = {province} if grades == __junior_first__ else set()
+        self.senior_last_provinces = {province} if grades == __senior_last__ else set()
+        self.stage_schools = {stage: {school}} if stage else {}
+        self.school_ids = {school.id}
+        self.locations = {school.location()}
+        self.provinces = {province}
+        self.ems_counter = Counter(columns.ems[idx].keys())
+        self.mode_cache = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def merge(self, other):
+        """将另一个记录组并入当前记录组。
+
+        other: 被合并的记录组，合并后不应再使用。
+        """
+
+        def union(mine, theirs):
+            for key, values in theirs.items():
+                if key in mine:
+                    mine[key] |= values
+                else:
+                    mine[key] = values
+
+        self.records.extend(other.records)
+        self.members |= other.members
+        self.blocks |= other.blocks
+        self.junior_first_provinces |= other.junior_first_provinces
+        self.senior_last_provinces |= other.senior_last_provinces
+        union(self.stage_schools, other.stage_schools)
+        self.school_ids |= other.school_ids
+        self.locations |= other.locations
+        self.provinces |= other.provinces
+        self.ems_counter.update(other.ems_counter)
+        self.mode_cache = None
+
+    def mode(self):
+        "获取最佳初中入学年份的列表，同 util.get_mode；结果在下次合并前保持不变，因此予以缓存。"
+
+        if self.mode_cache is None:
+            most = max(self.ems_counter.values())
+            self.mode_cache = sorted(k for k, v in self.ems_counter.items() if v == most)
+        return self.mode_cache
+
+    @staticmethod
+    def distance(A, B, inf=2147483647):
+        """获取两个记录组的距离，结果与 Record.distance(A.records, B.records, inf) 一致。
+
+        A: 第一个记录组。
+        B: 第二个记录组。
+        """
+
+        if A.blocks & B.members:
+            return inf
+
+        coeff = 1
+
+        # 升学时跨省的选手需要降低合并优先级，此时很有可能是错误合并
+        if __crossed__(A.senior_last_provinces, B.junior_first_provinces) or __crossed__(
+            A.junior_first_provinces, B.senior_last_provinces
+        ):
+            coeff = max(coeff, 3)  # Tentative
+
+        change_times = {
+            stage: A.stage_schools.get(stage, set()) | B.stage_schools.get(stage, set())
+            for stage in __grades_range__
+        }
+        schools = A.school_ids | B.school_ids
+        locations = A.locations | B.locations
+        provinces = A.provinces | B.provinces
+        aem = A.mode()
+        bem = B.mode()
+        diff = min(abs(i - j) for i in aem for j in bem)
+
+        # 在同一学段的转学次数一般不会超过一次
+        if any(len(change_times[stage]) >= 3 for stage in __grades_range__):
+            coeff = max(coeff, 5)  # Tentative
+
+        # 转学后在学校仍同一城市内的也需要降低合并优先级（与 Record.distance 保持一致）
+        for stage in __grades_range__:
+            if len(change_times[stage]) >= 2:
+                if len(set(i.location for i in change_times[stage])) == 1:
+                    coeff = max(coeff, 2.5)  # Tentative
+
+        return (
+            __school_penalty__.get(len(schools), 600)
+            + 80 * (len(locations) + len(provinces) - 3)
+            + 100 * diff
+        ) * coeff
+
+    @staticmethod
+    def check_stay_down(A, B):
+        """检测两个记录组的合并是否是因为留级等现象，结果与 Record.check_stay_down 一致。
+
+        A: 第一个记录组。
+        B: 第二个记录组。
+        """
+
+        if not (len(A.ems_counter) == 1 and len(B.ems_counter) == 1 and len(A) > 1 and len(B) > 1):
+            return 0
+
+        (aem,), (bem,) = A.ems_counter.keys(), B.ems_counter.keys()
+        if abs(aem - bem) != 1:
+            return 0
+
+        if len(A) < 2 if aem + 1 == bem else len(B) < 2:
+            return 0
+
+        schools = A.school_ids | B.school_ids
+        locations = A.locations | B.locations
+        provinces = A.provinces | B.provinces
+        penalty = __school_penalty__.get(len(schools), 600) + 80 * (len(locations) + len(provinces) - 3)
+        if penalty >= 100:
+            return 0
+
+        return bem - aem
+
+
+class __Features__:
+    "conflict_masks 中各规则共用的一组记录的特征与分桶；分桶的值为位集，第 i 位为 1 表示记录 i 属于该桶。"
+
+    def __init__(self, columns):
+        def bucket(features):
+            masks = {}
+            for idx, key in enumerate(features):
+                if key is not None:
+                    masks[key] = masks.get(key, 0) | (1 << idx)
+            return masks
+
+        self.contests = contests = columns.contests
+        self.schools = schools = columns.schools
+        self.grades = grades = columns.grades
+        self.provinces = provinces = columns.provinces
+        self.genders = columns.genders
+        self.years = [contest.year for contest in contests]
+        self.school_years = school_years = [contest.school_year() for contest in contests]
+        self.stages = stages = [__stage_of_grades__.get(g) for g in grades]
+        self.emss = columns.ems_masks
+        self.types = types = [__contest_type_map__.get(contest.type) for contest in contests]
+        names = [school.name for school in schools]
+        self.is_high = [
+            any(level in name for level in ["高中", "中学", "高级"]) and "小学" not in name for name in names
+        ]
+        self.is_primary = ["小学" in name for name in names]
+
+        self.by_contest = bucket(contests)
+        self.by_gender = bucket(self.genders)
+        self.by_year = bucket(self.years)
+        self.by_stage = bucket(stages)
+        self.by_stage_province = bucket(
+            (stage, province) if stage else None for stage, province in zip(stages, provinces)
+        )
+        self.by_ems = bucket(zip(school_years, self.emss))
+        self.by_type = bucket((sy, t) if t else None for sy, t in zip(school_years, types))
+        self.by_type_school = bucket(
+            (sy, t, school) if t else None for sy, t, school in zip(school_years, types, schools)
+        )
+        self.by_senior_first = bucket(
+            sy if g == __senior_first__ else None for sy, g in zip(school_years, grades)
+        )
+        self.by_junior_first = bucket(
+            sy if g == __junior_first__ else None for sy, g in zip(school_years, grades)
+        )
+        self.by_primary_name = bucket(
+            sy if primary else None for sy, primary in zip(school_years, self.is_primary)
+        )
+        self.by_high_name = bucket(sy if high else None for sy, high in zip(school_years, self.is_high))
+        # 按特征值缓存的位集，同名组中大量记录共享相同的年份与入学年份
+        self.far_years, self.disjoint_ems, self.later_primary, self.earlier_high = {}, {}, {}, {}
+
+
+def __rule_year_span__(f, idx):
+    "年份差异过大"
+    year = f.years[idx]
+    if year not in f.far_years:
+        f.far_years[year] = __union__(bits for y, bits in f.by_year.items() if abs(y - year) > 9)
+    return f.far_years[year]
+
+
+def __rule_same_contest__(f, idx):
+    "同一比赛中的多条获奖记录"
+    return f.by_contest[f.contests[idx]]
+
+
+def __rule_gender__(f, idx):
+    "性别不一致"
+    gender = f.genders[idx]
+    return f.by_gender.get(-gender, 0) if gender else 0
+
+
+def __rule_stage_province__(f, idx):
+    "同一学段内跨省获奖"
+    stage = f.stages[idx]
+    if not stage:
+        return 0
+    return f.by_stage[stage] & ~f.by_stage_province[stage, f.provinces[idx]]
+
+
+def __rule_enrollment__(f, idx):
+    "同一学年入学年份不一致"
+    sy, ems = key = f.school_years[idx], f.emss[idx]
+    if key not in f.disjoint_ems:
+        f.disjoint_ems[key] = __union__(
+            bits for (y, other), bits in f.by_ems.items() if y == sy and not ems & other
+        )
+    return f.disjoint_ems[key]
+
+
+def __rule_contest_school__(f, idx):
+    "同一学年同类赛事的参赛学校不一致"
+    sy, t = f.school_years[idx], f.types[idx]
+    if not t:
+        return 0
+    return f.by_type[sy, t] & ~f.by_type_school[sy, t, f.schools[idx]]
+
+
+def __rule_junior_to_senior__(f, idx, reverse=False):
+    "第一年初一，第二年直升高一"
+    sy, grades = f.school_years[idx], f.grades[idx]
+    if reverse:
+        first, later = __senior_first__, f.by_junior_first
+    else:
+        first, later = __junior_first__, f.by_senior_first
+    if grades != first:
+        return 0
+    return later.get(sy - 1, 0) | later.get(sy + 1, 0)
+
+
+def __rule_high_then_primary__(f, idx, reverse=False):
+    "中学记录之后又有小学记录"
+    sy = f.school_years[idx]
+    if reverse:
+        if not f.is_primary[idx]:
+            return 0
+        if sy not in f.earlier_high:
+            f.earlier_high[sy] = __union__(bits for y, bits in f.by_high_name.items() if y < sy)
+        return f.earlier_high[sy]
+    if not f.is_high[idx]:
+        return 0
+    if sy not in f.later_primary:
+        f.later_primary[sy] = __union__(bits for y, bits in f.by_primary_name.items() if y > sy)
+    return f.later_primary[sy]
+
+
+class DistanceRule:
+    """Record.distance 中的一条硬性规则，由 conflict_masks 在预处理冲突位集时求值。
+
+    mask(features, idx) 给出与记录 idx 冲突的记录的位集，features 为 __Features__ 对象；有向规则的 mask 另有参数
+    reverse，为假时给出记录 idx 所在的记录组在前时与之冲突的记录，为真时给出在后时与之冲突的记录。
+    cost 与 selectivity 为静态画像，分别为估计的相对开销与拒绝率。calls、hits 与 elapsed 为运行时统计的求值记录对数、
+    拒绝记录对数与耗时（纳秒），见 RulePipeline。"""
+
+    def __init__(self, name, mask, cost, selectivity, directed=False):
+        self.name = name
+        self.description = mask.__doc__
+        self.mask = mask
+        self.cost = cost
+        self.selectivity = selectivity
+        self.directed = directed
+        self.calls = self.hits = self.elapsed = 0
+
+    def rank(self, profile, timed):
+        """获取规则的排序键，越小越应优先求值。
+
+        profile: "static" 使用静态画像，"observed" 使用运行时统计（拒绝率做加一平滑，开销仅在计时时使用实测值）。
+        timed: 是否统计了各规则的耗时。
+        """
+
+        if profile == "static":
+            return self.cost / self.selectivity
+        cost = self.elapsed / self.calls if timed and self.calls else self.cost
+        return cost * (self.calls + 2) / (self.hits + 1)
+
+
+class RulePipeline:
+    """按顺序求值的硬性规则流水线，由 conflict_masks 执行，任一规则成立的记录对即存在硬性冲突。
+
+    统计以有序记录对 (p, q) 为单位：求值到某条规则时尚未被之前的规则拒绝的记录对计入其 calls，被其拒绝的计入 hits。
+    对称规则先于有向规则求值；纯 Python 实现中某条记录与其余记录组成的记录对全部被拒绝后，不再对该记录求值之后的规则，
+    因此开销小、拒绝率高的规则排在前面可以减少求值次数。profile 为 "declared" 时保持声明顺序，"static" 时按静态画像
+    排序，"observed" 时在每组记录合并前按运行时统计重新排序。各规则的判定互相独立，求值顺序只影响开销与统计，
+    不影响冲突位集。"""
+
+    def __init__(self, rules, profile="static"):
+        self.rules = rules
+        self.timed = False
+        self.reorder(profile)
+
+    def reorder(self, profile=None):
+        """重新确定规则的求值顺序。
+
+        profile: 可选，新的排序方式，见 RulePipeline。
+        """
+
+        if profile is not None:
+            if profile not in ("declared", "static", "observed"):
+                raise ValueError(f"未知的规则排序方式：\x1b[32m'{profile}'\x1b[0m")
+            self.profile = profile
+        if self.profile == "declared":
+            order = self.rules[:]
+        else:
+            order = sorted(self.rules, key=lambda rule: rule.rank(self.profile, self.timed))
+        self.symmetric = [rule for rule in order if not rule.directed]
+        self.directed = [rule for rule in order if rule.directed]
+        self.order = self.symmetric + self.directed
+
+    def adapt(self):
+        "使用运行时统计时，按当前统计重新排序。"
+
+        if self.profile == "observed":
+            self.reorder()
+
+    def evaluator(self, rule, function=None):
+        """获取一条规则的求值函数：不计时时即为 function 本身，计时时为累计其耗时的包装。
+
+        rule: 规则。
+        function: 可选，求值函数，默认为 rule.mask。
+        """
+
+        function = function or rule.mask
+        if not self.timed:
+            return function
+
+        def evaluate(*args):
+            start = perf_counter_ns()
+            result = function(*args)
+            rule.elapsed += perf_counter_ns() - start
+            return result
+
+        return evaluate
+
+    def counters(self, since=None):
+        """获取各规则的统计量。
+
+        since: 可选，此前 counters() 的返回值，给出时返回此后的增量。
+
+        返回值: {规则名: [求值记录对数, 拒绝记录对数, 耗时]}。
+        """
+
+        counters = {rule.name: [rule.calls, rule.hits, rule.elapsed] for rule in self.rules}
+        if since is not None:
+            for name, values in since.items():
+                counters[name] = [now - then for now, then in zip(counters[name], values)]
+        return counters
+
+    def absorb(self, counters):
+        """累加其他进程的统计量。
+
+        counters: counters() 的返回值。
+        """
+
+        for rule in self.rules:
+            calls, hits, elapsed = counters.get(rule.name, (0, 0, 0))
+            rule.calls += calls
+            rule.hits += hits
+            rule.elapsed += elapsed
+
+    def report(self):
+        "生成各规则的统计报告，按当前求值顺序排列。"
+
+        lines = [
+            f"distance rules ({self.profile} order):",
+            "rule\tpairs\thits\thit_rate\tns_per_pair\tdescription",
+        ]
+        for rule in self.order:
+            rate = f"{rule.hits / rule.calls:.4f}" if rule.calls else "-"
+            cost = f"{rule.elapsed / rule.calls:.1f}" if self.timed and rule.calls else "-"
+            lines.append(f"{rule.name}\t{rule.calls}\t{rule.hits}\t{rate}\t{cost}\t{rule.description}")
+        return "\n".join(lines)
+
+
+distance_rules = RulePipeline(
+    [
+        DistanceRule("year_span", __rule_year_span__, 4, 0.1),
+        DistanceRule("same_contest", __rule_same_contest__, 1, 0.01),
+        DistanceRule("gender", __rule_gender__, 1, 0.15),
+        DistanceRule("stage_province", __rule_stage_province__, 1, 0.25),
+        DistanceRule("enrollment", __rule_enrollment__, 6, 0.05),
+        DistanceRule("contest_school", __rule_contest_school__, 2, 0.01),
+        DistanceRule("junior_to_senior", __rule_junior_to_senior__, 2, 0.002, directed=True),
+        DistanceRule("high_then_primary", __rule_high_then_primary__, 3, 0.005, directed=True),
+    ]
+)
+
+
+def conflict_masks(columns):
+    """预处理一组记录两两之间的硬性冲突，即无论如何合并都会使 Record.distance 返回 inf 的记录对。
+
+    冲突以位集表示：第 i 个整数的第 j 位为 1 表示记录 i 与记录 j 冲突。对称冲突（同场比赛、性别不一致、
+    年份跨度过大、同学段跨省、同学年入学年份不相交、同学年同类赛事学校不一致）与记录组先后顺序无关；
+    有向冲突（初一后直升高一、中学后又有小学记录）仅在记录 i 所在的记录组位于记录 j 所在的记录组之前时成立。
+    各项冲突由 distance_rules 中的规则依次求值，并计入各规则的统计量。
+
+    columns: 同名选手的记录的 RecordColumns。
+
+    返回值: (symmetric, directed, reverse)，分别为对称冲突、有向冲突以及有向冲突的转置（reverse[i] 的第 j 位
+    即 directed[j] 的第 i 位）的位集列表。某条记录与其余记录的冲突全部确定后不再求值之后的规则，因此 directed 与
+    reverse 可能不完整，但 symmetric 与 symmetric | directed 总是完整的。
+    """
+
+    if np is not None and len(columns) >= __numpy_threshold__:
+        masks = __conflict_masks_numpy__(columns)
+        if masks is not None:
+            return masks
+
+    features = __Features__(columns)
+    symmetric_rules = [(rule, distance_rules.evaluator(rule)) for rule in distance_rules.symmetric]
+    directed_rules = [(rule, distance_rules.evaluator(rule)) for rule in distance_rules.directed]
+    full = (1 << len(columns)) - 1
+    symmetric, directed, reverse = [], [], []
+    for idx in range(len(columns)):
+        undecided = full ^ (1 << idx)
+        mask = 0
+        for rule, mask_of in symmetric_rules:
+            rule.calls += undecided.bit_count()
+            bits = mask_of(features, idx)
+            mask |= bits
+            if hits := bits & undecided:
+                rule.hits += hits.bit_count()
+                undecided ^= hits
+                if not undecided:
+                    break
+        symmetric.append(mask)
+
+        forward = backward = 0
+        if undecided:
+            for rule, mask_of in directed_rules:
+                rule.calls += undecided.bit_count()
+                bits = mask_of(features, idx)
+                forward |= bits
+                if hits := bits & undecided:
+                    rule.hits += hits.bit_count()
+                    undecided ^= hits
+                backward |= mask_of(features, idx, True)
+        directed.append(forward)
+        reverse.append(backward)
+    return symmetric, directed, reverse
+
+
+def __conflict_masks_numpy__(columns):
+    """使用 NumPy 以向量化的布尔矩阵计算 conflict_masks，适用于规模较大的同名组。
+
+    columns: 同名选手的记录的 RecordColumns。
+
+    返回值: 同 conflict_masks；入学年份跨度过大、无法用 int64 位集表示时返回 None。
+    """
+
+    def codes(values):
+        table = {}
+        return np.array([table.setdefault(value, len(table)) for value in values], dtype=np.int32)
+
+    def column(values):
+        return np.array(values, dtype=np.int32)
+
+    def to_bitsets(matrix):
+        packed = np.packbits(matrix, axis=1, bitorder="little")
+        return [int.from_bytes(row.tobytes(), "little") for row in packed]
+
+    contests, grades, ems_masks = columns.contests, columns.grades, columns.ems_masks
+    base = min((mask & -mask).bit_length() - 1 for mask in ems_masks)
+    if max(mask.bit_length() for mask in ems_masks) - base > 63:
+        return None
+
+    stage_codes = {stage: code for code, stage in enumerate(__grades_range__)}
+    type_codes = {t: code for code, t in enumerate(sorted(set(__contest_type_map__.values())))}
+    names = [school.name for school in columns.schools]
+    contest = column([c.id for c in contests])
+    year = column([c.year for c in contests])
+    sy = column([c.school_year() for c in contests])
+    stage = column([stage_codes.get(__stage_of_grades__.get(g), -1) for g in grades])
+    province = codes(columns.provinces)
+    school = column([s.id for s in columns.schools])
+    gender = column(columns.genders)
+    t = column([type_codes.get(__contest_type_map__.get(c.type), -1) for c in contests])
+    ems = np.array([mask >> base for mask in ems_masks], dtype=np.int64)
+    junior_first = np.array([g == __junior_first__ for g in grades])
+    senior_first = np.array([g == __senior_first__ for g in grades])
+    high = np.array(
+        [any(level in name for level in ["高中", "中学", "高级"]) and "小学" not in name for name in names]
+    )
+    primary = np.array(["小学" in name for name in names])
+
+    # 与 distance_rules 中的规则一一对应，第 i 行第 j 列为真表示记录 i 所在的记录组在前时与记录 j 冲突
+    def rule_year_span():
+        return np.abs(year[:, None] - year[None, :]) > 9
+
+    def rule_same_contest():
+        return contest[:, None] == contest[None, :]
+
+    def rule_gender():
+        return gender[:, None] * gender[None, :] == -1
+
+    def rule_stage_province():
+        return (
+            (stage[:, None] == stage[None, :])
+            & (stage[:, None] >= 0)
+            & (province[:, None] != province[None, :])
+        )
+
+    def rule_enrollment():
+        return (sy[:, None] == sy[None, :]) & ((ems[:, None] & ems[None, :]) == 0)
+
+    def rule_contest_school():
+        return (
+            (sy[:, None] == sy[None, :])
+            & (t[:, None] == t[None, :])
+            & (t[:, None] >= 0)
+            & (school[:, None] != school[None, :])
+        )
+
+    def rule_junior_to_senior():
+        return junior_first[:, None] & senior_first[None, :] & (np.abs(sy[:, None] - sy[None, :]) == 1)
+
+    def rule_high_then_primary():
+        return high[:, None] & primary[None, :] & (sy[:, None] < sy[None, :])
+
+    matrices = {
+        "year_span": rule_year_span,
+        "same_contest": rule_same_contest,
+        "gender": rule_gender,
+        "stage_province": rule_stage_province,
+        "enrollment": rule_enrollment,
+        "contest_school": rule_contest_school,
+        "junior_to_senior": rule_junior_to_senior,
+        "high_then_primary": rule_high_then_primary,
+    }
+    undecided = ~np.eye(len(columns), dtype=bool)
+    symmetric = np.zeros_like(undecided)
+    directed = np.zeros_like(undecided)
+    for rule in distance_rules.order:
+        conflicts = distance_rules.evaluator(rule, matrices[rule.name])()
+        hits = conflicts & undecided
+        rule.calls += int(np.count_nonzero(undecided))
+        rule.hits += int(np.count_nonzero(hits))
+        undecided &= ~hits
+        if rule.directed:
+            directed |= conflicts
+        else:
+            symmetric |= conflicts
+        if not undecided.any():
+            break
+    return to_bitsets(symmetric), to_bitsets(directed), to_bitsets(directed.T)
+
+
+def independent_parts(symmetric):
+    """根据对称冲突将一组记录划分为互相独立的部分，不同部分间的任意两条记录都存在对称冲突，因而不可能合并。
+
+    symmetric: conflict_masks 返回的对称冲突位集列表。
+
+    返回值: 各部分的记录下标列表，按首条记录的下标排序。
+    """
+
+    remaining = (1 << len(symmetric)) - 1
+    parts = []
+    while remaining:
+        low = remaining & -remaining
+        remaining ^= low
+        part, frontier = low, [low.bit_length() - 1]
+        while frontier and remaining:
+            reachable = remaining & ~symmetric[frontier.pop()]
+            remaining ^= reachable
+            part |= reachable
+            while reachable:
+                bit = reachable & -reachable
+                frontier.append(bit.bit_length() - 1)
+                reachable ^= bit
+        parts.append([idx for idx in range(len(symmetric)) if part >> idx & 1])
+    return parts
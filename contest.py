@@ -12,6 +12,17 @@ __re_score_with_rank__ = re.compile(r"^(\d+\.?\d+)\(rk(\d+)\)$")
 class Contest:
     __all_contests_list__ = []
     __all_contests_map__ = {}
+    __slots__ = (
+        "id",
+        "name",
+        "type",
+        "year",
+        "fall_semester",
+        "full_score",
+        "capacity",
+        "contestants",
+        "level_counts",
+    )
 
     def __init__(self, idx, settings):
         self.id = idx
@@ -89,6 +100,53 @@ class Contest:
 
         return self.capacity if self.capacity else len(self.contestants)
 
+    @staticmethod
+    def parse_score(score):
+        """解析分值字段。
+
+        score: 分值，格式见 is_score_valid。
+
+        返回值: (分数, 排名)，分数为空时为 None；排名仅在分值中显式给出时有值，否则为 None。
+        """
+
+        if result := re.match(__re_score_with_rank__, score):
+            return float(result.group(1)), int(result.group(2))
+        if score == "":
+            return None, None
+        return float(score), None
+
+    def check_first_score(self, score):
+        """检查第一名选手的分数是否超过满分。
+
+        score: 分数。
+        """
+
+        if not (score is None) and score > self.full_score:
+            print(
+                f"\x1b[01;33mwarning: \x1b[0m超过满分的分数：\x1b[32m{score}\x1b[0m > \x1b[32m{self.full_score}\x1b[0m，于比赛 \x1b[32m'{self.name}'\x1b[0m",
+                file=stderr,
+            )
+
+    def check_score_order(self, score, name, previous_score, previous_name):
+        """检查与前一名选手分数不同的选手的分数是否兼容且单调不增。
+
+        score: 分数。
+        name: 选手姓名。
+        previous_score: 前一名选手的分数。
+        previous_name: 前一名选手的姓名。
+        """
+
+        if (score is None) or (previous_score is None):
+            print(
+                f"\x1b[01;33mwarning: \x1b[0m不兼容的分数：\x1b[32m{score}\x1b[0m > \x1b[32m{previous_score}\x1b[0m，于比赛 \x1b[32m'{self.name}'\x1b[0m",
+                file=stderr,
+            )
+        elif score > previous_score:
+            print(
+                f"\x1b[01;33mwarning: \x1b[0m不单调的分数：\x1b[32m{score}\x1b[0m（{name}） > \x1b[32m{previous_score}\x1b[0m（{previous_name}），于比赛 \x1b[32m'{self.name}'\x1b[0m",
+                file=stderr,
+            )
+
     def add_contestant(self, oier, score, level, grades, school, province, gender):
         """添加一名选手到比赛。
 
@@ -99,35 +157,31 @@ class Contest:
         返回值: 选手参加比赛的记录 (Record) 类型。
         """
 
-        if result := re.match(__re_score_with_rank__, score):
-            score = float(result.group(1))
-            rank = int(result.group(2))
-        elif score == "":
-            score = None
+        score, rank = Contest.parse_score(score)
+        return self.add_parsed_contestant(oier, score, rank, level, grades, school, province, gender)
+
+    def add_parsed_contestant(self, oier, score, rank, level, grades, school, province, gender):
+        """添加一名分值已经解析过的选手到比赛，参数同 add_contestant。
+
+        score: 分数，为空时为 None。
+        rank: 分值中显式给出的排名，未给出时为 None。
+
+        返回值: 选手参加比赛的记录 (Record) 类型。
+        """
+
+        if rank is not None:
+            pass
+        elif score is None:
             rank = len(self.contestants) + 1
+        elif len(self.contestants) == 0:
+            self.check_first_score(score)
+            rank = 1
+        elif score == self.contestants[-1].score:
+            rank = self.contestants[-1].rank
         else:
-            score = float(score)
-            if len(self.contestants) == 0:
-                if not (score is None) and score > self.full_score:
-                    print(
-                        f"\x1b[01;33mwarning: \x1b[0m超过满分的分数：\x1b[32m{score}\x1b[0m > \x1b[32m{self.full_score}\x1b[0m，于比赛 \x1b[32m'{self.name}'\x1b[0m",
-                        file=stderr,
-                    )
-                rank = 1
-            elif score == self.contestants[-1].score:
-                rank = self.contestants[-1].rank
-            else:
-                if (score is None) or (self.contestants[-1].score is None):
-                    print(
-                        f"\x1b[01;33mwarning: \x1b[0m不兼容的分数：\x1b[32m{score}\x1b[0m > \x1b[32m{self.contestants[-1].score}\x1b[0m，于比赛 \x1b[32m'{self.name}'\x1b[0m",
-                        file=stderr,
-                    )
-                elif score > self.contestants[-1].score:
-                    print(
-                        f"\x1b[01;33mwarning: \x1b[0m不单调的分数：\x1b[32m{score}\x1b[0m（{oier.name}） > \x1b[32m{self.contestants[-1].score}\x1b[0m（{self.contestants[-1].oier.name}），于比赛 \x1b[32m'{self.name}'\x1b[0m",
-                        file=stderr,
-                    )
-                rank = len(self.contestants) + 1
+            previous = self.contestants[-1]
+            self.check_score_order(score, oier.name, previous.score, previous.oier.name)
+            rank = len(self.contestants) + 1
 
         record = Record(oier, self, score, rank, level, grades, school, province, gender)
         self.contestants.append(record)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import os
+import sqlite3
+from contest import Contest
+from oier import OIer
+from school import School
+import util
+
+"""
+将生成结果导出为 SQLite 数据库，包含 contests、schools、oiers、records 四张表（结构见 __schema__），
+便于直接用 SQL 查询，例如某学校历年的 NOI 获奖选手：
+
+    SELECT c.year, o.name, r.level FROM records r
+    JOIN oiers o ON o.uid = r.oier_uid
+    JOIN contests c ON c.id = r.contest_id
+    JOIN schools s ON s.id = r.school_id
+    WHERE s.name = ? AND c.type = 'NOI' ORDER BY c.year;
+"""
+__schema__ = """
+CREATE TABLE contests (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL, year INTEGER NOT NULL,
+    fall_semester INTEGER NOT NULL, full_score REAL, capacity INTEGER, n_contestants INTEGER NOT NULL
+);
+CREATE TABLE schools (
+    id INTEGER PRIMARY KEY, name TEXT NOT NULL, province TEXT NOT NULL, city TEXT NOT NULL,
+    score REAL NOT NULL
+);
+CREATE TABLE oiers (
+    uid INTEGER PRIMARY KEY, name TEXT NOT NULL, initials TEXT NOT NULL, gender INTEGER NOT NULL,
+    enroll_middle INTEGER NOT NULL, oierdb_score REAL NOT NULL, ccf_score REAL NOT NULL,
+    ccf_level INTEGER NOT NULL
+);
+CREATE TABLE records (
+    id INTEGER PRIMARY KEY, oier_uid INTEGER NOT NULL, contest_id INTEGER NOT NULL,
+    school_id INTEGER NOT NULL,
+    score REAL, rank INTEGER NOT NULL, level TEXT NOT NULL, province TEXT NOT NULL,
+    enroll_middle INTEGER NOT NULL, keep_grade INTEGER NOT NULL
+);
+"""
+# 索引在数据全部写入后再建立，比逐行维护索引快得多
+__indexes__ = """
+CREATE INDEX schools_name ON schools (name);
+CREATE INDEX schools_province ON schools (province, city);
+CREATE INDEX oiers_name ON oiers (name);
+CREATE INDEX oiers_initials ON oiers (initials);
+CREATE INDEX oiers_score ON oiers (oierdb_score);
+CREATE INDEX records_oier ON records (oier_uid);
+CREATE INDEX records_contest ON records (contest_id, rank);
+CREATE INDEX records_school ON records (school_id);
+CREATE INDEX records_province ON records (province);
+CREATE INDEX records_score ON records (contest_id, score);
+"""
+
+
+def __records__(oiers, table=None):
+    # 记录的入学年份表是共享的（见 util.enrollment_middle），同一张表只需计算一次
+    modes = {}
+    if table is not None:
+        yield from __table_records__(oiers, table, modes)
+        return
+    for oier in oiers:
+        for record in oier.records:
+            ems = record.ems
+            if id(ems) not in modes:
+                modes[id(ems)] = (ems, util.get_weighted_mode([ems])[0])
+            yield (
+                record.id,
+                oier.uid,
+                record.contest.id,
+                record.school.id,
+                record.score,
+                record.rank,
+                record.level,
+                record.province,
+                modes[id(ems)][1],
+                record.is_keep_grade(),
+            )
+
+
+def __table_records__(oiers, table, modes):
+    "同 __records__，按行号直接读取 RecordTable（见 record_table.py）中的各列。"
+
+    for oier in oiers:
+        for idx in oier.records:
+            ems = table.ems_of(idx)
+            if id(ems) not in modes:
+                modes[id(ems)] = (ems, util.get_weighted_mode([ems])[0])
+            yield (
+                table.first_id + idx,
+                oier.uid,
+                table.contest[idx],
+                table.school[idx],
+                table.score_of(idx),
+                table.rank[idx],
+                table.levels[table.level[idx]],
+                table.provinces[table.province[idx]],
+                modes[id(ems)][1],
+                bool(table.keep_grade_flag[idx]),
+            )
+
+
+def export(path, table=None):
+    """将当前的比赛、学校、OIer 及比赛记录导出为 SQLite 数据库。
+
+    先写入临时文件，完成后再替换 path，因此导出中断时不会留下不完整的数据库。
+
+    path: 数据库路径。
+    table: 可选，记录所在的 RecordTable，给出时 OIer 的 records 为其行号。
+    """
+
+    temp = path + ".tmp"
+    if os.path.exists(temp):
+        os.remove(temp)
+    db = sqlite3.connect(temp)
+    try:
+        # 临时文件导出失败时直接丢弃，无需日志与同步
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.executescript(__schema__)
+        with db:
+            db.executemany(
+                "INSERT INTO contests VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        c.id,
+                        c.name,
+                        c.type,
+                        c.year,
+                        c.fall_semester,
+                        c.full_score,
+                        c.capacity,
+                        c.n_contestants(),
+                    )
+                    for c in Contest.get_all()
+                ),
+            )
+            db.executemany(
+                "INSERT INTO schools VALUES (?, ?, ?, ?, ?)",
+                ((s.id, s.name, s.province, s.city, float(s.score)) for s in School.get_all()),
+            )
+            db.executemany(
+                "INSERT INTO oiers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        o.uid,
+                        o.name,
+                        o.initials,
+                        o.gender,
+                        o.enroll_middle,
+                        float(o.oierdb_score),
+                        float(o.ccf_score),
+                        o.ccf_level,
+                    )
+                    for o in OIer.get_all()
+                ),
+            )
+            db.executemany(
+                "INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                __records__(OIer.get_all(), table),
+            )
+        db.executescript(__indexes__)
+        db.execute("ANALYZE")
+    finally:
+        db.close()
+    os.replace(temp, path)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import gzip
+import json
+from sys import argv, exit, stderr
+
+"""
+合并树（dendrogram）文件为 gzip 压缩的 JSON Lines：
+- 第一行为文件头 {"version": 版本, "max_threshold": 记录时的距离阈值, "fixed": 无需合并的 OIer 数}；
+- 之后每行对应一组同名记录 [姓名, 记录数, 合并序列列表]，每个合并序列为
+  [[距离, 靠前记录组首条记录下标, 靠后记录组首条记录下标, 留级检测结果], ...]。
+"""
+__version__ = 1
+
+
+def cut(n, sequences, threshold):
+    """在给定阈值处截断合并序列，得到与直接以该阈值合并相同的结果。
+
+    贪心合并在距离首次超过阈值时停止，而各合并序列互相独立，因此每个序列只需保留距离首次超过阈值之前的部分。
+
+    n: 记录数。
+    sequences: 合并序列列表，见 merge.greedy_merge 的 steps 参数。
+    threshold: 距离阈值，不应超过记录合并序列时使用的阈值。
+
+    返回值: (clusters, keep)，clusters 为各记录组的记录下标列表（按首条记录下标排序），keep 为需要保留年级的记录下标列表。
+    """
+
+    clusters = {idx: [idx] for idx in range(n)}
+    keep = []
+    for sequence in sequences:
+        for dist, bi, bj, stay_down in sequence:
+            if dist > threshold:
+                break
+            if stay_down == 1:
+                keep.extend(clusters[bi])
+            elif stay_down == -1:
+                keep.extend(clusters[bj])
+            clusters[bi].extend(clusters.pop(bj))
+    return [clusters[idx] for idx in sorted(clusters)], keep
+
+
+def save(path, max_threshold, fixed, groups):
+    """保存合并树。
+
+    path: 文件路径。
+    max_threshold: 记录合并序列时使用的距离阈值。
+    fixed: 无需合并（手动指定）的 OIer 数。
+    groups: (姓名, 记录数, 合并序列列表) 的列表。
+    """
+
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+        header = {"version": __version__, "max_threshold": max_threshold, "fixed": fixed}
+        f.write((json.dumps(header) + "\n").encode("utf-8"))
+        for name, n, sequences in groups:
+            line = json.dumps([name, n, sequences], ensure_ascii=False, separators=(",", ":"))
+            f.write((line + "\n").encode("utf-8"))
+
+
+def load(path):
+    """读取合并树。
+
+    path: 文件路径。
+
+    返回值: (header, groups)，含义同 save 的参数。
+    """
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != __version__:
+            raise ValueError(f"不支持的合并树版本：\x1b[32m{header.get('version')}\x1b[0m")
+        return header, [json.loads(line) for line in f]
+
+
+def sweep(header, groups, thresholds):
+    """统计各距离阈值下的合并结果。
+
+    header: 合并树文件头。
+    groups: 合并树中的各组记录。
+    thresholds: 距离阈值列表。
+
+    返回值: (阈值, OIer 数, 未完全合并的组数, 保留年级的记录数) 的列表。
+    """
+
+    rows = []
+    for threshold in thresholds:
+        if threshold > header["max_threshold"]:
+            print(
+                f"\x1b[01;33mwarning: \x1b[0m阈值 \x1b[32m{threshold}\x1b[0m 超过记录时使用的阈值 \x1b[32m{header['max_threshold']}\x1b[0m，结果可能不准确",
+                file=stderr,
+            )
+        oiers, incomplete, kept = header["fixed"], 0, 0
+        for _, n, sequences in groups:
+            clusters, keep = cut(n, sequences, threshold)
+            oiers += len(clusters)
+            incomplete += len(clusters) != 1
+            kept += len(set(keep))
+        rows.append((threshold, oiers, incomplete, kept))
+    return rows
+
+
+def main():
+    """用法: python dendrogram.py <合并树文件> <阈值>...
+
+    输出各阈值下的 OIer 数、未完全合并的组数及保留年级的记录数。
+    """
+
+    if len(argv) < 3:
+        print(main.__doc__, file=stderr)
+        exit(1)
+    header, groups = load(argv[1])
+    print("threshold\toiers\tincomplete\tkeep_grade")
+    for row in sweep(header, groups, [float(x) if "." in x else int(x) for x in argv[2:]]):
+        print("\t".join(map(str, row)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+from oier import OIer
+from record import Record
+from tqdm import tqdm
+import parallel
+import util
+
+
+class ResultEncoder:
+    """dist/result.txt 的编码器，输出与逐行调用 OIer.to_compress_format 完全一致。
+
+    省份与奖项使用预先建立的编号表，分数、入学年份等重复出现的片段只格式化一次；
+    编码结果按块拼接后整块写入，给出多个进程时各块在子进程中并行编码，再按原顺序写入。
+
+    给出 table（见 record_table.py）时 OIer 的 records 为其行号，各字段直接读取表中的列。"""
+
+    def __init__(self, table=None):
+        self.table = table
+        self.province_codes = {province: str(idx) for idx, province in enumerate(util.provinces)}
+        self.level_codes = {level: str(idx) for idx, level in enumerate(util.award_levels)}
+        self.score_cache = {}
+        self.ems_cache = {}
+
+    def __province__(self, province):
+        code = self.province_codes.get(province)
+        # 未知的省份不缓存，以便与 Record.to_compress_format 一样每次都输出警告
+        return code if code is not None else str(Record.__province_format__(province))
+
+    def __level__(self, level):
+        code = self.level_codes.get(level)
+        return code if code is not None else str(Record.__award_level_format__(level))
+
+    def __score__(self, score):
+        text = self.score_cache.get(score)
+        if text is None:
+            text = self.score_cache[score] = Record.__score_format__(score)
+        return text
+
+    def __ems__(self, ems):
+        # 入学年份表是共享的（见 util.enrollment_middle），因此以 id 为键；同时保存引用以免 id 被复用
+        entry = self.ems_cache.get(id(ems))
+        if entry is None:
+            entry = self.ems_cache[id(ems)] = (ems, str(util.get_weighted_mode([ems])[0]))
+        return entry[1]
+
+    def encode_record(self, record, reference_em):
+        """编码一条比赛记录，同 Record.to_compress_format。
+
+        record: 比赛记录。
+        reference_em: 所属 OIer 的初中入学年份。
+        """
+
+        # 编号与分数均为非空字符串（空分数除外），查表未命中时才调用对应的方法
+        score = record.score
+        s = "{}:{}:{}:{}:{}:{}".format(
+            record.contest.id,
+            record.school.id,
+            self.score_cache.get(score) or self.__score__(score),
+            record.rank,
+            self.province_codes.get(record.province) or self.__province__(record.province),
+            self.level_codes.get(record.level) or self.__level__(record.level),
+        )
+        if record.keep_grade_flag:
+            return s + ";" + self.__ems__(record.ems)
+        ems = record.ems
+        if reference_em not in ems:
+            return s + ":" + self.__ems__(ems)
+        return s
+
+    def encode_row(self, idx, reference_em):
+        """编码 RecordTable 中的一行，同 encode_record。
+
+        idx: 行号。
+        reference_em: 所属 OIer 的初中入学年份。
+        """
+
+        table = self.table
+        score = table.score_of(idx)
+        province, level = table.provinces[table.province[idx]], table.levels[table.level[idx]]
+        s = "{}:{}:{}:{}:{}:{}".format(
+            table.contest[idx],
+            table.school[idx],
+            self.score_cache.get(score) or self.__score__(score),
+            table.rank[idx],
+            self.province_codes.get(province) or self.__province__(province),
+            self.level_codes.get(level) or self.__level__(level),
+        )
+        ems = table.ems_of(idx)
+        if table.keep_grade_flag[idx]:
+            return s + ";" + self.__ems__(ems)
+        if reference_em not in ems:
+            return s + ":" + self.__ems__(ems)
+        return s
+
+    def encode(self, oier):
+        """编码一名 OIer，同 OIer.to_compress_format。
+
+        oier: OIer。
+        """
+
+        em = oier.enroll_middle
+        if self.table is None:
+            records = "/".join([self.encode_record(record, em) for record in oier.records])
+        else:
+            records = "/".join([self.encode_row(idx, em) for idx in oier.records])
+        return "{},{},{},{},{},{},{},{},{}".format(
+            oier.uid,
+            oier.initials,
+            oier.name,
+            oier.gender,
+            em,
+            OIer.__float2p_format__(oier.oierdb_score),
+            OIer.__float2p_format__(float(oier.ccf_score)),
+            oier.ccf_level,
+            records,
+        )
+
+    def encode_chunk(self, oiers):
+        """编码若干名 OIer。
+
+        oiers: OIer 列表。
+
+        返回值: 各行以换行符结尾拼接而成的字符串。
+        """
+
+        return "".join([self.encode(oier) + "\n" for oier in oiers])
+
+    def write(self, f, oiers, jobs=1, chunk_size=4096, taps=()):
+        """将 OIer 逐行编码后写入文件。
+
+        f: 以文本方式打开的文件对象。
+        oiers: OIer 列表，按输出顺序排列。
+        jobs: 进程数，大于 1 时各块在子进程中编码。
+        chunk_size: 每块的 OIer 数。
+        taps: 同时接收各行的其他输出（如 shard.ShardWriter），各行以 tap.write(oier, line) 交给它们。
+        """
+
+        bounds = [(start, min(start + chunk_size, len(oiers))) for start in range(0, len(oiers), chunk_size)]
+        texts = parallel.imap(lambda bound: self.encode_chunk(oiers[bound[0] : bound[1]]), bounds, jobs)
+        with tqdm(total=len(oiers)) as bar:
+            for (start, end), text in zip(bounds, texts):
+                f.write(text)
+                if taps:
+                    # 姓名中不含换行符，因此按换行符切分即得各行
+                    for oier, line in zip(oiers[start:end], text.split("\n")):
+                        for tap in taps:
+                            tap.write(oier, line + "\n")
+                bar.update(end - start)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from sys import argv, exit, stderr
+
+"""
+dist/result.idx 为 dist/result.txt 的索引，用于按 uid、姓名或姓名首字母直接定位到 result.txt 中的行：
+- 文件头：魔数 b"OIDX"、版本（u32）、元数据字节数（u32），之后为 UTF-8 编码的 JSON 元数据
+  {"count": 行数, "size": result.txt 的字节数, "sha512": result.txt 的摘要, "provinces": 省份表, "award_levels": 奖项表}，
+  以空格补齐到 8 字节的整数倍；
+- 之后依次为 uid、姓名、姓名首字母三张表，每张表为 count 个键与 count 个行首偏移量，均为小端序 u64，按键排序。
+  uid 表的键为 uid，其余两张表的键为 UTF-8 编码的 BLAKE2b（8 字节，小端序）摘要，查找时需核对该行的实际内容。
+
+本模块中的读取部分不依赖其他模块，可直接复制使用。
+"""
+__magic__ = b"OIDX"
+__version__ = 1
+__header__ = struct.Struct("<4sII")
+
+
+def __key__(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def __to_little__(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class IndexWriter:
+    """生成 result.txt 的索引，作为 encoder.ResultEncoder.write 的 tap 逐行接收 result.txt 的内容。"""
+
+    def __init__(self, path, provinces, award_levels):
+        """
+        path: 索引的输出路径。
+        provinces: 省份表，见 util.provinces。
+        award_levels: 奖项表，见 util.award_levels。
+        """
+
+        self.path = path
+        self.provinces = provinces
+        self.award_levels = award_levels
+        self.entries = [[], [], []]
+        self.sha512, self.size = hashlib.sha512(), 0
+
+    def write(self, oier, line):
+        """记录一行的位置。
+
+        oier: 该行对应的 OIer。
+        line: 以换行符结尾的一行。
+        """
+
+        data = line.encode("utf-8")
+        offset = self.size
+        self.sha512.update(data)
+        self.size += len(data)
+        uids, names, initials = self.entries
+        uids.append((oier.uid, offset))
+        names.append((__key__(oier.name), offset))
+        initials.append((__key__(oier.initials), offset))
+
+    def close(self):
+        "写入索引。"
+
+        from sink import open_artifact  # 在此导入，使读取部分不依赖其他模块
+
+        meta = {
+            "count": len(self.entries[0]),
+            "size": self.size,
+            "sha512": self.sha512.hexdigest(),
+            "provinces": self.provinces,
+            "award_levels": self.award_levels,
+        }
+        meta = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        meta += b" " * (-(__header__.size + len(meta)) % 8)
+        with open_artifact(self.path, binary=True) as f:
+            f.write(__header__.pack(__magic__, __version__, len(meta)))
+            f.write(meta)
+            for entries in self.entries:
+                entries.sort()
+                f.write(__to_little__(array("Q", [key for key, _ in entries])).tobytes())
+                f.write(__to_little__(array("Q", [offset for _, offset in entries])).tobytes())
+
+
+class ResultReader:
+    """按需读取 result.txt 中的 OIer：result.txt 与索引均以内存映射方式打开，每次查找只解码用到的行；
+    学校与比赛通过 static.json 还原。用完后应调用 close（或使用 with 语句）。
+
+    打开时只核对 result.txt 的字节数，以及索引中记录的摘要与 result.info.json（生成 result.txt 时写入）中的摘要，
+    不读取 result.txt 的内容；需要逐字节核对时给出 verify=True 或调用 verify，此时会读取整个文件。"""
+
+    def __init__(self, directory="dist", verify=False):
+        """
+        directory: result.txt、result.idx 与 static.json 所在的目录。
+        verify: 是否在打开时重新计算 result.txt 的摘要并与索引核对。
+        """
+
+        with open(os.path.join(directory, "result.txt"), "rb") as f:
+            self.result = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(os.path.join(directory, "result.idx"), "rb") as f:
+            self.index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size = __header__.unpack_from(self.index)
+        if magic != __magic__ or version != __version__:
+            self.close()
+            raise ValueError("不支持的索引文件")
+        self.meta = json.loads(self.index[__header__.size : __header__.size + size])
+        # 只比较字节数时，重新生成的同样大小的 result.txt 会被误用，偏移量指向错误的行，
+        # 因此同时比较 result.txt 生成时记录的摘要；信息文件不存在时只能依赖字节数（或 verify）
+        info = os.path.join(directory, "result.info.json")
+        sha512 = self.meta["sha512"]
+        if os.path.exists(info):
+            with open(info, encoding="utf-8") as f:
+                sha512 = json.load(f).get("sha512")
+        matched = self.meta["size"] == len(self.result) and self.meta["sha512"] == sha512
+        if not matched or verify and not self.verify():
+            self.close()
+            raise ValueError("索引与 result.txt 不匹配，请重新生成")
+        with open(os.path.join(directory, "static.json"), encoding="utf-8") as f:
+            static = json.load(f)
+        self.contests, self.schools = static["contests"], static["schools"]
+
+        count, start = self.meta["count"], __header__.size + size
+        # 关闭内存映射前须释放其上的全部 memoryview
+        self.views = [memoryview(self.index)[start : start + 48 * count]]
+        if sys.byteorder == "big":
+            self.views.append(memoryview(__to_little__(array("Q", bytes(self.views[-1])))))
+        self.views.append(self.views[-1].cast("B"))
+        self.views.append(self.views[-1].cast("Q"))
+        tables = self.views[-1]
+        # 各表为 (键, 行首偏移量)
+        self.tables = [
+            (tables[2 * k * count : (2 * k + 1) * count], tables[(2 * k + 1) * count : (2 * k + 2) * count])
+            for k in range(3)
+        ]
+        self.views += [view for table in self.tables for view in table]
+
+    def verify(self):
+        """重新计算 result.txt 的摘要并与索引中记录的摘要比较，会读取整个文件。
+
+        返回值: 是否一致。
+        """
+
+        return hashlib.sha512(self.result).hexdigest() == self.meta["sha512"]
+
+    def close(self):
+        "关闭 result.txt 与索引的内存映射。"
+
+        for view in reversed(getattr(self, "views", [])):
+            view.release()
+        self.views, self.tables = [], []
+        self.result.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __offsets__(self, table, key):
+        keys, offsets = self.tables[table]
+        idx = bisect.bisect_left(keys, key)
+        while idx < len(keys) and keys[idx] == key:
+            yield offsets[idx]
+            idx += 1
+
+    def line(self, offset):
+        """读取 result.txt 中的一行。
+
+        offset: 行首偏移量。
+
+        返回值: 不含换行符的字符串。
+        """
+
+        end = self.result.find(b"\n", offset)
+        return self.result[offset : end if end >= 0 else len(self.result)].decode("utf-8")
+
+    def by_uid(self, uid):
+        """按 uid 查找 OIer。
+
+        返回值: decode 的结果，不存在时为 None。
+        """
+
+        for offset in self.__offsets__(0, uid):
+            return self.decode(self.line(offset))
+        return None
+
+    def by_name(self, name):
+        """按姓名查找 OIer。
+
+        返回值: decode 的结果的列表，按 result.txt 中的顺序（DB 评分从高到低）排列。
+        """
+
+        lines = [self.line(offset) for offset in sorted(self.__offsets__(1, __key__(name)))]
+        return [self.decode(line) for line in lines if line.split(",", 3)[2] == name]
+
+    def by_initials(self, initials):
+        """按姓名首字母查找 OIer。
+
+        返回值: 同 by_name。
+        """
+
+        lines = [self.line(offset) for offset in sorted(self.__offsets__(2, __key__(initials)))]
+        return [self.decode(line) for line in lines if line.split(",", 2)[1] == initials]
+
+    def __code__(self, table, text):
+        return self.meta[table][int(text)] if text.isdigit() else text
+
+    def decode(self, line):
+        """解码 result.txt 中的一行。
+
+        line: 不含换行符的一行。
+
+        返回值: 字典，学校、比赛、省份与奖项均已还原为名称或完整信息。
+        """
+
+        uid, initials, name, gender, em, oierdb_score, ccf_score, ccf_level, records = line.split(",", 8)
+        oier = {
+            "uid": int(uid),
+            "initials": initials,
+            "name": name,
+            "gender": int(gender),
+            "enroll_middle": int(em),
+            "oierdb_score": float(oierdb_score),
+            "ccf_score": float(ccf_score),
+            "ccf_level": int(ccf_level),
+            "records": [],
+        }
+        for record in records.split("/"):
+            keep_grade = ";" in record
+            contest, school, score, rank, province, level, *year = record.replace(";", ":").split(":")
+            school_name, school_province, city, _ = self.schools[int(school)]
+            school = {"id": int(school), "name": school_name, "province": school_province, "city": city}
+            oier["records"].append(
+                {
+                    "contest": self.contests[int(contest)],
+                    "school": school,
+                    "score": float(score) if score else None,
+                    "rank": int(rank),
+                    "province": self.__code__("provinces", province),
+                    "level": self.__code__("award_levels", level),
+                    "enroll_middle": int(year[0]) if year else None,
+                    "keep_grade": keep_grade,
+                }
+            )
+        return oier
+
+
+def main():
+    """用法: python index.py [--dist=目录] [--verify] <uid|姓名|姓名首字母>...
+
+    按 uid、姓名或姓名首字母查找 OIer，以 JSON 输出；目录默认为 dist。给出 --verify 时先逐字节核对 result.txt 的摘要。
+    """
+
+    args = [arg for arg in argv[1:] if not arg.startswith("--dist=") and arg != "--verify"]
+    if not args:
+        print(main.__doc__, file=stderr)
+        exit(1)
+    directory = next((arg[len("--dist=") :] for arg in argv[1:] if arg.startswith("--dist=")), "dist")
+    with ResultReader(directory, "--verify" in argv[1:]) as reader:
+        for arg in args:
+            if arg.isdigit():
+                found = [oier] if (oier := reader.by_uid(int(arg))) else []
+            elif arg.isascii():
+                found = reader.by_initials(arg)
+            else:
+                found = reader.by_name(arg)
+            for oier in found:
+                print(json.dumps(oier, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
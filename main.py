@@ -1,22 +1,44 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 
-import hashlib
 import json
-import os
 import util
+from cluster import distance_rules
+from binary import BinaryResultWriter
 from contest import Contest
+from encoder import ResultEncoder
+from index import IndexWriter
 from oier import OIer
-from record import Record
+from patch import PatchWriter
+from record_table import RecordTable
 from school import School
-from sys import argv, stderr, executable
+from shard import ShardWriter
+from sys import argv, stderr, executable, intern
 from tqdm import tqdm
+import binary
+import database
+import dendrogram
+import memo
+import merge
+import parallel
+import scoring
+import sink
 import subprocess
 
 
 def __main__():
     gender_map = {"男": 1, "女": -1}
     new_schools = []
+    # 给出 --record-table 时比赛记录以列式存储（见 record_table.py）
+    record_table = RecordTable() if "--record-table" in argv else None
+    # 给出 --precompress 时同时生成 dist/result.txt 的 .gz、.br、.zst 版本（见 sink.py）
+    precompress_variants = sink.precompress_variants() if "--precompress" in argv else ()
+    # 给出 --shards N 时按姓名分片输出（见 shard.py），N 须为正整数，在开始处理前检查
+    shards = util.get_option("--shards")
+    if shards is not None:
+        if not shards.isdigit() or int(shards) <= 0:
+            raise ValueError(f"--shards 须为正整数：\x1b[32m'{shards}'\x1b[0m")
+        shards = int(shards)
 
     def parse_school_line(line):
         """解析 school.txt 文件的一行。
@@ -30,30 +52,33 @@ def __main__():
         if len(li) < 3:
             raise ValueError("格式错误")
         province, city, name, *aliases = li
-        School.create(name, province, city, aliases)
+        School.create(name, intern(province), intern(city), aliases)
 
     def parse_school():
-        "解析 school.txt 文件。"
+        "解析 school.txt 文件，可通过 --school-file 指定其他路径，- 表示标准输入。"
 
-        with open("data/school.txt", encoding="utf-8") as f:
-            raw_data = f.readlines()
-        for idx, line in tqdm(enumerate(raw_data), total=len(raw_data)):
+        for idx, line in util.read_lines(util.get_option("--school-file", "data/school.txt")):
             try:
                 parse_school_line(line.strip())
             except ValueError as e:
                 print(
-                    f"\x1b[01mschool.txt:{idx + 1}: \x1b[031merror: \x1b[0;37m'{line.strip()}'\x1b[0m，{e}",
+                    f"\x1b[01mschool.txt:{idx}: \x1b[031merror: \x1b[0;37m'{line.strip()}'\x1b[0m，{e}",
                     file=stderr,
                 )
 
-    def parse_raw_line(line):
-        """解析 raw.txt 文件的一行。
+    def resolve_raw_line(line, warnings, unknown_schools):
+        """解析 raw.txt 文件的一行中与其他行无关的部分，不创建任何数据，因此可以在子进程中执行。
 
         line: 一行。
+        warnings: 列表，解析过程中产生的警告追加到其中。
+        unknown_schools: 列表，无法识别的 (省份, 学校名) 追加到其中。
+
+        返回值: (contest, level, name, grades, school, score, rank, province, gender, identifier)，
+        score 与 rank 见 Contest.parse_score；注释行返回 None。
         """
 
         if line.startswith("#"):  # 注释
-            return
+            return None
         li = line.split(",")
         if len(li) != 9:
             raise ValueError("格式错误")
@@ -66,41 +91,128 @@ def __main__():
             school = School.by_name_in_province(school_name, province)
         except ValueError as e:
             if '--disable-school-fallback' in argv:
-                new_schools.append((province, school_name))
+                unknown_schools.append((province, school_name))
                 raise e
             else:
                 try:
-                    print(
-                        f"\x1b[33mwarning: \x1b[0;37m无法识别学校名 \x1b[35m'{school_name}'\x1b[0m 在省份 \x1b[35m'{province}'\x1b[0m 中，回退到全局查找\x1b[0m",
-                        file=stderr,
+                    warnings.append(
+                        f"\x1b[33mwarning: \x1b[0;37m无法识别学校名 \x1b[35m'{school_name}'\x1b[0m 在省份 \x1b[35m'{province}'\x1b[0m 中，回退到全局查找\x1b[0m"
                     )
                     school = School.by_name(school_name)
                 except ValueError as e:
-                    new_schools.append((province, school_name))
+                    unknown_schools.append((province, school_name))
                     raise e
 
         grades = util.get_grades(grade_name)
         gender = gender_map.get(gender_name, 0)
         if not Contest.is_score_valid(score):
             raise ValueError(f"无法识别的分数：\x1b[032m'{score}'\x1b[0m")
-        # 开始创建数据
+        score, rank = Contest.parse_score(score)
+        return contest, level, name, grades, school, score, rank, province, gender, identifier
+
+    def add_raw_record(contest, level, name, grades, school, score, rank, province, gender, identifier):
+        "根据 resolve_raw_line 的结果创建选手及比赛记录，需按文件顺序调用。"
+
+        # 省份与奖项名称的取值很少，驻留后各记录共享同一字符串
+        province, level = intern(province), intern(level)
         oier = OIer.of(name, identifier)
-        record = contest.add_contestant(oier, score, level, grades, school, province, gender)
+        args = (oier, score, rank, level, grades, school, province, gender)
+        if record_table is not None:
+            record = record_table.append_parsed(contest, *args)
+        else:
+            record = contest.add_parsed_contestant(*args)
         oier.add_record(record)
 
-    def parse_raw():
-        "解析 raw.txt 文件。"
+    def parse_raw_line(line):
+        """解析 raw.txt 文件的一行。
+
+        line: 一行。
+        """
+
+        warnings = []
+        try:
+            fields = resolve_raw_line(line, warnings, new_schools)
+        finally:
+            for warning in warnings:
+                print(warning, file=stderr)
+        if fields is not None:
+            add_raw_record(*fields)
+
+    def parse_raw_block(block):
+        """在子进程中解析同一比赛的连续若干行，见 resolve_raw_line。
+
+        block: (行号, 行) 的列表。
+
+        返回值: 各行的 (行号, 行, 警告列表, 无法识别的学校列表, 解析结果, 错误信息)，
+        解析结果中的比赛与学校以 ID 表示。
+        """
 
-        with open("data/raw.txt", encoding="utf-8") as f:
-            raw_data = f.readlines()
-        for idx, line in tqdm(enumerate(raw_data), total=len(raw_data)):
+        results = []
+        for idx, line in block:
+            warnings, unknown_schools, fields, error = [], [], None, None
             try:
-                parse_raw_line(line.strip())
+                fields = resolve_raw_line(line.strip(), warnings, unknown_schools)
             except ValueError as e:
-                print(
-                    f"\x1b[01mraw.txt:{idx + 1}: \x1b[31merror: \x1b[0;37m'{line.strip()}'\x1b[0m，{e}",
-                    file=stderr,
-                )
+                error = str(e)
+            if fields is not None:
+                contest, level, name, grades, school, *rest = fields
+                fields = (contest.id, level, name, grades, school.id, *rest)
+            results.append((idx, line, warnings, unknown_schools, fields, error))
+        return results
+
+    def split_raw_blocks(lines, size=4096):
+        """将 raw.txt 按比赛切分为连续的块，同一比赛的行较多时再切分为不超过 size 行的块。
+
+        lines: (行号, 行) 的可迭代对象。
+        """
+
+        block, current = [], None
+        for idx, line in lines:
+            contest_name = line.split(",", 1)[0]
+            if block and (len(block) >= size or (contest_name != current and not line.startswith("#"))):
+                yield block
+                block = []
+            if not line.startswith("#"):
+                current = contest_name
+            block.append((idx, line))
+        if block:
+            yield block
+
+    def report_raw_error(idx, line, e):
+        print(
+            f"\x1b[01mraw.txt:{idx}: \x1b[31merror: \x1b[0;37m'{line.strip()}'\x1b[0m，{e}",
+            file=stderr,
+        )
+
+    def parse_raw():
+        """解析 raw.txt 文件，可通过 --raw-file 指定其他路径，- 表示标准输入。
+
+        给出 --parse-jobs（默认同 --jobs）大于 1 时，按比赛切分后在子进程中并行解析与其他行无关的部分，
+        再由当前进程按文件顺序创建数据，因此记录 ID 与错误信息均与串行解析一致。
+        """
+
+        lines = util.read_lines(util.get_option("--raw-file", "data/raw.txt"))
+        jobs = int(util.get_option("--parse-jobs", util.get_option("--jobs", 1)))
+        if jobs <= 1:
+            for idx, line in lines:
+                try:
+                    parse_raw_line(line.strip())
+                except ValueError as e:
+                    report_raw_error(idx, line, e)
+        else:
+            contests, schools = Contest.get_all(), School.get_all()
+            for results in parallel.imap(parse_raw_block, split_raw_blocks(lines), jobs):
+                for idx, line, warnings, unknown_schools, fields, error in results:
+                    for warning in warnings:
+                        print(warning, file=stderr)
+                    new_schools.extend(unknown_schools)
+                    if error is not None:
+                        report_raw_error(idx, line, error)
+                    elif fields is not None:
+                        contest_id, level, name, grades, school_id, *rest = fields
+                        add_raw_record(contests[contest_id], level, name, grades, schools[school_id], *rest)
+        if record_table is not None:
+            record_table.finalize()
 
     def attempt_merge(threshold=240):
         """尝试合并信息。
@@ -108,36 +220,66 @@ def __main__():
         threshold: 距离阈值。
         """
 
+        if "--reference-merge" in argv:
+            merge_engine = merge.greedy_merge
+        elif "--verify-two-tier-merge" in argv:
+            merge_engine = merge.verify_two_tier_merge
+        elif "--two-tier-merge" in argv:
+            merge_engine = merge.two_tier_merge
+        else:
+            merge_engine = merge.heap_merge
+        jobs = int(util.get_option("--jobs", 1))
+        # 距离计算中硬性规则的求值顺序与统计
+        report_rules = "--report-distance-rules" in argv
+        if report_rules and merge_engine is merge.greedy_merge:
+            print("\x1b[01;33mwarning: \x1b[0m参考实现不经过距离规则流水线，各规则的统计量均为 0", file=stderr)
+        distance_rules.timed = report_rules
+        distance_rules.reorder(util.get_option("--distance-rule-order", "static"))
+        # 给出 --dendrogram 时记录完整的合并树，便于之后调整阈值
+        dendrogram_path = util.get_option("--dendrogram")
+        max_threshold = int(util.get_option("--dendrogram-max-threshold", 1000)) if dendrogram_path else None
+        # 给出 --merge-cache 时复用上次运行中未发生变化的同名组的合并结果
+        memo_path = util.get_option("--merge-cache")
+        merge_memo = None
+        if memo_path:
+            merge_memo = memo.MergeMemo(memo_path, memo.rules_key(threshold, merge_engine, max_threshold))
+        # 手动合并的无需拆分
+        merged = [oier for oier in OIer.get_all() if not oier.identifier]
+        groups = [oier.records for oier in merged]
+        results = merge.merge_all(
+            groups, threshold, merge_engine, jobs, max_threshold, merge_memo, record_table
+        )
+        if merge_memo is not None:
+            merge_memo.save()
+            print(
+                f"合并缓存命中 \x1b[32m{merge_memo.hits}\x1b[0m 组，重新合并 \x1b[32m{merge_memo.misses}\x1b[0m 组",
+                file=stderr,
+            )
+        if dendrogram_path:
+            dendrogram.save(
+                dendrogram_path,
+                max_threshold,
+                OIer.count_all() - len(groups),
+                [
+                    (oier.name, len(oier.records), steps)
+                    for oier, (*_, steps) in zip(merged, results)
+                ],
+            )
+        results = iter(results)
+        if report_rules:
+            print(distance_rules.report(), file=stderr)
         recordseqs = []
-        length = OIer.count_all()
-        for idx, oier in tqdm(enumerate(OIer.get_all()), total=OIer.count_all()):
-            # tqdm
-            # 手动合并的无需拆分
+        for oier in OIer.get_all():
             if oier.identifier:
                 recordseqs.append(oier.records)
                 continue
             original_length = len(oier.records)
-            a = [[record] for record in oier.records]
-            while True:
-                n, best, bi, bj = len(a), threshold + 1, -1, -1
-                for i in range(n):
-                    for j in range(i):
-                        if (dist := Record.distance(a[j], a[i], threshold + 1)) < best:
-                            best, bi, bj = dist, j, i
-                if best <= threshold:
-                    stay_down = Record.check_stay_down(a[bi], a[bj])
-                    if stay_down == 1:
-                        for record in a[bi]:
-                            record.keep_grade()
-                    elif stay_down == -1:
-                        for record in a[bj]:
-                            record.keep_grade()
-                    else:
-                        assert stay_down == 0
-                    a[bi].extend(a[bj])
-                    del a[bj]
+            a, keep, _ = next(results)
+            for record in keep:
+                if record_table is None:
+                    record.keep_grade()
                 else:
-                    break
+                    record_table.keep_grade_flag[record] = 1
             if "--show-incomplete-merge" in argv and len(a) != 1:
                 print(
                     f"\x1b[01;33mwarning: \x1b[0;32m'{oier.name}'\x1b[0m 未完全合并，合并进度为 \x1b[32m{original_length}\x1b[0m → \x1b[32m{len(a)}\x1b[0m",
@@ -146,25 +288,54 @@ def __main__():
             recordseqs.extend(a)
         OIer.clear()
         for recordseq in tqdm(recordseqs):
-            original = recordseq[0].oier
-            # UID 定为该 OIer 首次出现的<b>有效</b>行号
-            uid = min(recordseq, key=lambda record: record.id).id
+            if record_table is None:
+                original = recordseq[0].oier
+                # UID 定为该 OIer 首次出现的<b>有效</b>行号
+                uid = min(recordseq, key=lambda record: record.id).id
+                emss = [record.ems for record in recordseq if not record.is_keep_grade()]
+                gender = set(record.gender for record in recordseq if record.gender)
+            else:
+                # 记录 ID 随行号递增，各字段按行号直接读取
+                original = record_table.oier[recordseq[0]]
+                uid = record_table.first_id + min(recordseq)
+                emss = [
+                    record_table.ems_of(idx) for idx in recordseq if not record_table.keep_grade_flag[idx]
+                ]
+                gender = set(record_table.gender[idx] for idx in recordseq if record_table.gender[idx])
             # 入学年份取众数，相同的话取最早的
-            em = util.get_weighted_mode([record.ems for record in recordseq if not record.is_keep_grade()])[0]
+            em = util.get_weighted_mode(emss)[0]
             # 性别如果唯一则取之，空或不唯一置空（如跨性别）
-            gender = set(record.gender for record in recordseq if record.gender)
             gender = gender.pop() if len(gender) == 1 else 0
             oier = OIer(original.name, original.identifier, gender, em, uid)
             oier.records = recordseq[:]
-            for record in oier.records:
-                record.oier = oier
+            if record_table is None:
+                for record in oier.records:
+                    record.oier = oier
+            else:
+                for idx in oier.records:
+                    record_table.oier[idx] = oier
 
     def analyze_individual_oier():
-        "分析各体信息。"
+        """分析各体信息。
 
+        给出 --batch-scoring 时 DB 评分以浮点数批量计算（见 scoring.py）；
+        给出 --verify-scoring 时仍逐条计算 Decimal 评分，并检查批量计算的输出是否与之一致。
+        """
+
+        batch = "--batch-scoring" in argv and "--verify-scoring" not in argv
+        OIer.compute_all_ccf_levels(record_table)
+        if batch:
+            scoring.assign_scores(OIer.get_all(), School.get_all(), record_table)
+            return
         for oier in tqdm(OIer.get_all()):
-            oier.compute_ccf_level()
-            oier.compute_oierdb_score()
+            oier.compute_oierdb_score(record_table)
+        if "--verify-scoring" in argv:
+            errors = scoring.verify_scores(OIer.get_all(), School.get_all(), record_table)
+            for error in errors[:20]:
+                print(f"\x1b[31m  - {error}\x1b[0m", file=stderr)
+            if errors:
+                raise ValueError(f"批量计算的 DB 评分有 {len(errors)} 处与逐条计算的结果不一致")
+            print("\x1b[32m批量计算的 DB 评分与逐条计算的结果一致\x1b[0m", file=stderr)
 
     def validate_data():
         "验证数据完整性，检查是否存在重复的 UID、学校 ID、比赛 ID 及【比赛 ID、UID】组合。"
@@ -201,6 +372,9 @@ def __main__():
         # 检查重复的【比赛 ID、UID】组合
         contest_uid_pairs = []
         for oier in OIer.get_all():
+            if record_table is not None:
+                contest_uid_pairs.extend((record_table.contest[idx], oier.uid) for idx in oier.records)
+                continue
             for record in oier.records:
                 contest_uid_pairs.append((record.contest.id, oier.uid))
         
@@ -284,41 +458,69 @@ def __main__():
             json.dump(output, f, ensure_ascii=False)
 
     def output_compressed():
-        "输出压缩的结果，不压缩的结果先咕着。"
-
-        OIer.sort_by_score()
-        with open("dist/result.txt", "w", newline="\n", encoding="utf-8") as f:
-            for oier in tqdm(OIer.get_all()):
-                print(oier.to_compress_format(), file=f, end="\n")
-
-    def compute_sha512():
+        """输出压缩的结果，不压缩的结果先咕着。
+
+        给出 --output-jobs（默认同 --jobs）大于 1 时，各块 OIer 在子进程中并行编码（见 encoder.py）；
+        给出 --shards N 时同时按姓名分为 N 个以内容摘要命名的分片，输出到 dist/result 中（见 shard.py）；
+        给出 --binary 时同时输出二进制格式的 dist/result.bin（见 binary.py），
+        给出 --verify-binary 时还会将其解码并检查是否与 dist/result.txt 一致；
+        给出 --previous-result PATH 时同时输出相对于该文件的增量补丁 dist/result.patch.json（见 patch.py）；
+        给出 --index 时同时输出按 uid、姓名及姓名首字母定位各行的索引 dist/result.idx（见 index.py）。
         """
-        计算 dist/result.txt 的 SHA512 值，保存在 sha512/result 中。
-        （注：使用 *.txt 后缀可以利用 gzip 压缩）
-        """
-
-        file_size = os.stat("dist/result.txt").st_size
 
-        with open("dist/result.txt", "rb") as f:
-            sha512 = hashlib.sha512(f.read()).hexdigest()
-        with open("dist/result.info.json", "w", newline="\n", encoding="utf-8") as f:
-            print('{"sha512":"' + sha512 + '", "size":' + str(file_size) + "}", file=f)
+        OIer.sort_by_score()
+        jobs = int(util.get_option("--output-jobs", util.get_option("--jobs", 1)))
+        taps = []
+        if shards:
+            taps.append(ShardWriter("dist/result", "dist/result.manifest.json", shards))
+        if "--binary" in argv or "--verify-binary" in argv:
+            taps.append(BinaryResultWriter("dist/result.bin", precompress_variants))
+        if previous := util.get_option("--previous-result"):
+            taps.append(PatchWriter(previous, "dist/result.patch.json"))
+        if "--index" in argv:
+            taps.append(IndexWriter("dist/result.idx", util.provinces, util.award_levels))
+        with sink.open_artifact("dist/result.txt", variants=precompress_variants) as f:
+            ResultEncoder(record_table).write(f, OIer.get_all(), jobs, taps=taps)
+        for tap in taps:
+            if isinstance(tap, PatchWriter):
+                added, replaced, removed = tap.close()
+                print(
+                    f"增量补丁：新增 \x1b[32m{added}\x1b[0m，替换 \x1b[32m{replaced}\x1b[0m，删除 \x1b[32m{removed}\x1b[0m",
+                    file=stderr,
+                )
+            else:
+                tap.close()
+        if "--verify-binary" in argv:
+            with open(sink.info_path("dist/result.txt"), encoding="utf-8") as f:
+                sha512 = json.load(f)["sha512"]
+            if not binary.verify("dist/result.bin", sha512):
+                raise ValueError("dist/result.bin 解码后与 dist/result.txt 不一致")
+            print("\x1b[32mdist/result.bin 解码后与 dist/result.txt 一致\x1b[0m", file=stderr)
 
     def update_static():
         "调用 update_static.py 以产生静态 JSON 信息。"
         
-        subprocess.run([executable, "update_static.py"], check=True)
+        subprocess.run([executable, "update_static.py", *argv[1:]], check=True)
 
     def report_status(message):
-        "向终端报告当前进度。"
+        "向终端报告当前进度，给出 --report-memory 时一并报告截至目前的内存占用峰值。"
 
-        print(f"================ {message} ================", file=stderr)
+        if "--report-memory" in argv and (peak := util.peak_memory()):
+            print(
+                f"峰值内存占用：\x1b[32m{peak[0]:.1f}\x1b[0m MiB（子进程 \x1b[32m{peak[1]:.1f}\x1b[0m MiB）",
+                file=stderr,
+            )
+        if message:
+            print(f"================ {message} ================", file=stderr)
 
+    # 批量创建学校、比赛记录时不需要分代垃圾回收
     report_status("读取学校信息中")
-    parse_school()
+    with util.gc_suspended():
+        parse_school()
 
     report_status("读取选手信息中")
-    parse_raw()
+    with util.gc_suspended():
+        parse_raw()
 
     report_status("合并信息中")
     attempt_merge()
@@ -336,14 +538,16 @@ def __main__():
     report_status("输出到 dist/result.txt 中")
     output_compressed()
 
-    report_status("计算 SHA512 摘要中")
-    compute_sha512()
-
     report_status("输出学校信息中")
     output_schools()
 
+    if sqlite := util.get_option("--sqlite"):
+        report_status(f"输出到 {sqlite} 中")
+        database.export(sqlite, record_table)
+
     report_status("输出静态 JSON 信息中")
     update_static()
+    report_status(None)
 
 
 if __name__ == "__main__":
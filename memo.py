@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import gzip
+import hashlib
+import json
+import os
+from cluster import RecordColumns
+from sys import stderr
+
+"""
+合并缓存文件为 gzip 压缩的 JSON Lines：
+- 第一行为文件头 {"version": 版本, "key": 合并规则摘要}；
+- 之后每行对应一组同名记录 [记录指纹, 记录组列表, 保留年级的记录列表, 合并序列列表]，
+  记录组均以组内记录下标表示，合并序列见 dendrogram.py，未记录时为 null。
+"""
+__version__ = 1
+# 决定合并结果的源文件，任一文件变化都会使缓存失效：距离与合并算法、合并序列的截断（dendrogram.cut）
+# 以及记录指纹所取的字段（本文件）
+__rule_sources__ = ["cluster.py", "dendrogram.py", "memo.py", "merge.py", "record.py"]
+
+
+def __record_key__(columns, idx):
+    "获取单条记录中影响合并结果的字段，columns 为记录所在组的 cluster.RecordColumns，idx 为记录在组内的下标。"
+
+    contest, school = columns.contests[idx], columns.schools[idx]
+    return [
+        contest.id,
+        contest.year,
+        contest.school_year(),
+        contest.type,
+        columns.grades[idx],
+        school.id,
+        school.name,
+        school.location(),
+        columns.provinces[idx],
+        columns.genders[idx],
+        sorted(columns.ems[idx].items()),
+    ]
+
+
+def fingerprint(records, table=None):
+    """计算一组同名记录的指纹，记录的顺序会影响合并时的平局处理，因此按原顺序计入。
+
+    records: 同名选手的记录列表，给出 table 时为 RecordTable 的行号列表。
+    table: 可选，记录所在的 RecordTable。
+
+    返回值: 十六进制字符串。
+    """
+
+    oier = records[0].oier if table is None else table.oier[records[0]]
+    columns = RecordColumns(records, table)
+    payload = [oier.name, oier.identifier, [__record_key__(columns, idx) for idx in range(len(records))]]
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def rules_key(threshold, engine, max_threshold=None):
+    """计算合并规则摘要，包含缓存格式版本、决定合并结果的源文件内容及合并参数。
+
+    threshold: 距离阈值。
+    engine: 合并算法。
+    max_threshold: 记录合并序列时使用的距离阈值，未记录时为 None。
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([__version__, threshold, engine.__name__, max_threshold]).encode("utf-8"))
+    for name in __rule_sources__:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class MergeMemo:
+    """持久化的合并结果缓存，以记录指纹为键。
+
+    文件头中的合并规则摘要与当前不一致时整个缓存作废；保存时只写入本次运行中用到的条目，
+    因此已删除或修改过的同名组不会无限累积。"""
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self.entries = {}
+        self.used = {}
+        self.hits = self.misses = 0
+        if not os.path.exists(path):
+            return
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                if header.get("version") != __version__ or header.get("key") != key:
+                    print(
+                        f"\x1b[01;33mwarning: \x1b[0m合并缓存 \x1b[0;32m'{path}'\x1b[0m 已过期，将重新合并",
+                        file=stderr,
+                    )
+                    return
+                for line in f:
+                    fp, *value = json.loads(line)
+                    self.entries[fp] = value
+        except (OSError, EOFError, ValueError) as e:
+            print(
+                f"\x1b[01;33mwarning: \x1b[0m无法读取合并缓存 \x1b[0;32m'{path}'\x1b[0m：{e}",
+                file=stderr,
+            )
+            self.entries = {}
+
+    def get(self, fp):
+        """查询缓存。
+
+        fp: 记录指纹。
+
+        返回值: (clusters, keep, steps)，未命中时为 None。
+        """
+
+        value = self.entries.get(fp)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used[fp] = value
+        return value
+
+    def put(self, fp, clusters, keep, steps):
+        """写入缓存。
+
+        fp: 记录指纹。
+        clusters: 各记录组的记录下标列表。
+        keep: 需要保留年级的记录下标列表。
+        steps: 合并序列列表，未记录时为 None。
+        """
+
+        self.used[fp] = [clusters, keep, steps]
+
+    def save(self):
+        "保存缓存，先写入临时文件再替换，避免中断时留下损坏的缓存。"
+
+        temp = self.path + ".tmp"
+        with open(temp, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            f.write((json.dumps({"version": __version__, "key": self.key}) + "\n").encode("utf-8"))
+            for fp, value in self.used.items():
+                f.write((json.dumps([fp, *value], separators=(",", ":")) + "\n").encode("utf-8"))
+        os.replace(temp, self.path)
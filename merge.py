@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import dendrogram
+import heapq
+import parallel
+from cluster import Cluster, RecordColumns, __union__, conflict_masks, distance_rules, independent_parts
+from memo import fingerprint as memo_fingerprint
+from os import getpid
+from record import Record, __school_penalty__
+from sys import stderr
+from tqdm import tqdm
+
+# 两个记录组距离的最小可能值：同一学校且入学年份众数有交集，省份相同，或省份不同但为升学跨省（系数为 3）
+__min_distance__ = __school_penalty__[1] + 80 * (1 + 1 - 3)
+assert __min_distance__ == (__school_penalty__[1] + 80 * (1 + 2 - 3)) * 3
+
+
+def __apply_stay_down__(stay_down, A, B, keep):
+    """根据留级检测结果记录需要保留年级的记录。
+
+    stay_down: check_stay_down 的返回值。
+    A: 位置靠前的记录组。
+    B: 位置靠后的记录组。
+    keep: 需要保留年级的记录列表。
+    """
+
+    if stay_down == 1:
+        keep.extend(A)
+    elif stay_down == -1:
+        keep.extend(B)
+    else:
+        assert stay_down == 0
+
+
+def __record_step__(steps, dist, bi, bj, stay_down):
+    """记录一次合并，用于生成合并树（见 dendrogram.py）。
+
+    steps: 合并序列的列表，为 None 时不记录。
+    dist: 合并距离。
+    bi: 位置靠前的记录组的首条记录下标。
+    bj: 位置靠后的记录组的首条记录下标。
+    stay_down: check_stay_down 的返回值。
+    """
+
+    if steps is not None:
+        steps[-1].append((dist, bi, bj, stay_down))
+
+
+def greedy_merge(records, threshold, steps=None, table=None):
+    """朴素的贪心合并，每轮重新扫描所有记录组对，作为参考实现。
+
+    records: 同名选手的记录列表，给出 table 时为 RecordTable 的行号列表。
+    threshold: 距离阈值。
+    steps: 可选，合并序列的列表；给出时每个互相独立的合并序列追加为其中一项，
+        每次合并记为 (距离, 靠前记录组首条记录下标, 靠后记录组首条记录下标, 留级检测结果)。
+    table: 可选，记录所在的 RecordTable；Record.distance 需要逐条记录的接口，因此临时为各行创建视图。
+
+    返回值: (clusters, keep)，clusters 为合并后的记录组列表，keep 为需要保留年级的记录列表，
+    其中的元素与 records 中的相同。
+    """
+
+    if table is not None:
+        clusters, keep = greedy_merge([table.view(idx) for idx in records], threshold, steps)
+        return [[row.index for row in cluster] for cluster in clusters], [row.index for row in keep]
+    a = [[record] for record in records]
+    position = {id(record): pos for pos, record in enumerate(records)}
+    keep = []
+    if steps is not None:
+        steps.append([])
+    while True:
+        n, best, bi, bj = len(a), threshold + 1, -1, -1
+        for i in range(n):
+            for j in range(i):
+                if (dist := Record.distance(a[j], a[i], threshold + 1)) < best:
+                    best, bi, bj = dist, j, i
+        if best <= threshold:
+            stay_down = Record.check_stay_down(a[bi], a[bj])
+            __apply_stay_down__(stay_down, a[bi], a[bj], keep)
+            __record_step__(steps, best, position[id(a[bi][0])], position[id(a[bj][0])], stay_down)
+            a[bi].extend(a[bj])
+            del a[bj]
+        else:
+            break
+    return a, keep
+
+
+def __prepare__(records, table=None):
+    """为一组记录预处理硬性冲突并建立初始记录组。
+
+    records: 同名选手的记录列表，给出 table 时为 RecordTable 的行号列表。
+    table: 可选，记录所在的 RecordTable。
+
+    返回值: (columns, a, compatible, parts)，columns 为这组记录的 RecordColumns，a 为各记录对应的记录组，
+    compatible 见 __heap_merge_part__，parts 为 independent_parts 划分出的各部分。
+    """
+
+    columns = RecordColumns(records, table)
+    symmetric, directed, reverse = conflict_masks(columns)
+    a = [Cluster(columns, idx, 1 << idx, symmetric[idx] | directed[idx]) for idx in range(len(records))]
+    compatible = [~(symmetric[idx] | reverse[idx]) for idx in range(len(records))]
+    return columns, a, compatible, independent_parts(symmetric)
+
+
+def __heap_merge_part__(a, part, compatible, threshold, keep, steps):
+    """对一个独立部分执行基于优先队列的贪心合并。
+
+    a: 各记录对应的记录组，已被并入其他记录组者为 None。
+    part: 该部分的记录下标列表（升序）。
+    compatible: 位集列表，compatible[i] 的第 j 位为 1 表示记录 j 在前、记录 i 在后时不存在硬性冲突。
+    threshold: 距离阈值。
+    keep: 需要保留年级的记录列表。
+    steps: 合并序列的列表，见 greedy_merge。
+
+    返回值: 该部分中剩余记录组的下标列表。
+    """
+
+    def push(j, i):
+        if (dist := Cluster.distance(a[j], a[i], threshold + 1)) <= threshold:
+            heapq.heappush(heap, (dist, i, j, version[i], version[j]))
+
+    alive = [idx for idx in part if a[idx] is not None]
+    version = {idx: 0 for idx in alive}
+    heap = []
+    leaders = __union__(1 << idx for idx in alive)
+    for i in alive:
+        # 只需考虑与该记录组中所有记录都不存在硬性冲突的记录组
+        candidates = leaders & ((1 << i) - 1)
+        members = a[i].members
+        while members:
+            low = members & -members
+            members ^= low
+            candidates &= compatible[low.bit_length() - 1]
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            j = low.bit_length() - 1
+            if (dist := Cluster.distance(a[j], a[i], threshold + 1)) <= threshold:
+                heap.append((dist, i, j, 0, 0))
+    heapq.heapify(heap)
+    if steps is not None:
+        steps.append([])
+    while heap:
+        dist, bj, bi, vj, vi = heapq.heappop(heap)
+        if a[bj] is None or a[bi] is None or version[bj] != vj or version[bi] != vi:
+            continue
+        stay_down = Cluster.check_stay_down(a[bi], a[bj])
+        __apply_stay_down__(stay_down, a[bi].records, a[bj].records, keep)
+        __record_step__(steps, dist, bi, bj, stay_down)
+        a[bi].merge(a[bj])
+        a[bj] = None
+        alive.remove(bj)
+        version[bi] += 1
+        for k in alive:
+            if k < bi:
+                push(k, bi)
+            elif k > bi:
+                push(bi, k)
+    return alive
+
+
+def heap_merge(records, threshold, steps=None, table=None):
+    """基于优先队列的贪心合并，结果与 greedy_merge 完全一致。
+
+    记录组以其首条记录的下标标识，合并时保留位置靠前者，因此记录组之间的相对顺序始终与下标顺序一致，
+    按 (距离, 靠后下标, 靠前下标) 出堆即可复现朴素算法的平局处理。
+    每次合并后只重新计算与新记录组相关的距离，过期的堆元素通过版本号惰性删除。
+    距离基于增量维护的记录组摘要 (Cluster) 计算；预处理得到的硬性冲突用于跳过不可能合并的记录组对，
+    并将记录划分为互相独立的部分分别合并。
+
+    records: 同名选手的记录列表，给出 table 时为 RecordTable 的行号列表。
+    threshold: 距离阈值。
+    steps: 可选，合并序列的列表，见 greedy_merge；每个独立部分分别记为一个序列。
+    table: 可选，记录所在的 RecordTable，各列直接按行号读取。
+
+    返回值: (clusters, keep)，含义同 greedy_merge。
+    """
+
+    _, a, compatible, parts = __prepare__(records, table)
+    keep = []
+    alive = []
+    for part in parts:
+        alive.extend(__heap_merge_part__(a, part, compatible, threshold, keep, steps))
+    return [a[idx].records for idx in sorted(alive)], keep
+
+
+def two_tier_merge(records, threshold, steps=None, table=None):
+    """两阶段合并：先合并几乎确定属于同一人的记录，再对预合并的记录组执行 heap_merge。
+
+    两个记录组的距离取到最小可能值 __min_distance__ 时二者必然只包含同一学校的记录，此时朴素算法总会
+    优先合并这样的记录组对。第一阶段先以并查集按 (学校, 入学年份) 将记录划分为连通分量（近似线性时间），
+    再在各分量内寻找距离为最小值的记录组对，并按 (靠后下标, 靠前下标) 的顺序依次合并，因此与朴素算法合并过程的
+    前缀一致；第二阶段在剩余的少量记录组上继续执行 heap_merge。
+
+    每次合并都会改变记录组的入学年份众数，一对记录组的距离是否仍为最小值取决于之前的合并，不能直接用并查集合并，
+    因此分量内仍需逐对计算距离并按顺序合并，耗时为各分量记录数的平方和，通常远小于整组记录数的平方。
+
+    records: 同名选手的记录列表，给出 table 时为 RecordTable 的行号列表。
+    threshold: 距离阈值。
+    steps: 可选，合并序列的列表，见 greedy_merge；第一阶段记为一个序列，第二阶段的每个独立部分各记为一个序列。
+    table: 可选，记录所在的 RecordTable，见 heap_merge。
+
+    返回值: (clusters, keep)，含义同 greedy_merge。
+    """
+
+    columns, a, compatible, parts = __prepare__(records, table)
+    keep = []
+    if steps is not None:
+        steps.append([])
+
+    version = [0] * len(records)
+    heap = []
+
+    def push(j, i):
+        if Cluster.distance(a[j], a[i], threshold + 1) == __min_distance__:
+            heapq.heappush(heap, (i, j, version[i], version[j]))
+
+    # 距离为最小值的两个记录组只包含同一学校的记录，且入学年份众数有交集，因此二者中必有一对同一学校、
+    # 可能的入学年份相同的记录；按 (学校, 入学年份) 以并查集将记录划分为连通分量，第一阶段的合并只发生在分量内部
+    parent = list(range(len(records)))
+
+    def find(idx):
+        while parent[idx] != idx:
+            parent[idx] = idx = parent[parent[idx]]
+        return idx
+
+    first = {}
+    for idx, (school, ems) in enumerate(zip(columns.schools, columns.ems)):
+        for year in ems:
+            if (key := (school.id, year)) in first:
+                parent[find(idx)] = find(first[key])
+            else:
+                first[key] = idx
+    buckets = {}
+    bucket_of = []
+    for idx in range(len(records)):
+        bucket_of.append(buckets.setdefault(find(idx), []))
+        bucket_of[idx].append(idx)
+    for bucket in buckets.values():
+        for ii, i in enumerate(bucket):
+            for j in bucket[:ii]:
+                push(j, i)
+    while heap:
+        bj, bi, vj, vi = heapq.heappop(heap)
+        if a[bj] is None or a[bi] is None or version[bj] != vj or version[bi] != vi:
+            continue
+        stay_down = Cluster.check_stay_down(a[bi], a[bj])
+        __apply_stay_down__(stay_down, a[bi].records, a[bj].records, keep)
+        __record_step__(steps, __min_distance__, bi, bj, stay_down)
+        a[bi].merge(a[bj])
+        a[bj] = None
+        bucket = bucket_of[bi]
+        bucket.remove(bj)
+        version[bi] += 1
+        for k in bucket:
+            if k < bi:
+                push(k, bi)
+            elif k > bi:
+                push(bi, k)
+
+    alive = []
+    for part in parts:
+        alive.extend(__heap_merge_part__(a, part, compatible, threshold, keep, steps))
+    return [a[idx].records for idx in sorted(alive)], keep
+
+
+def verify_two_tier_merge(records, threshold, steps=None, table=None):
+    """同时执行 two_tier_merge 与 heap_merge 并比对结果，不一致时输出警告，返回 heap_merge 的结果。
+
+    records: 同名选手的记录列表，给出 table 时为 RecordTable 的行号列表。
+    threshold: 距离阈值。
+    steps: 可选，记录 heap_merge 的合并序列，见 greedy_merge。
+    table: 可选，记录所在的 RecordTable，见 heap_merge。
+
+    返回值: (clusters, keep)，含义同 greedy_merge。
+    """
+
+    clusters, keep = heap_merge(records, threshold, steps, table)
+    candidate_clusters, candidate_keep = two_tier_merge(records, threshold, table=table)
+    # Record 按对象比较，行号按值比较，二者都只在同一条记录时相等
+    if clusters != candidate_clusters or set(keep) != set(candidate_keep):
+        oier = records[0].oier if table is None else table.oier[records[0]]
+        print(
+            f"\x1b[01;33mwarning: \x1b[0;32m'{oier.name}'\x1b[0m 两阶段合并的结果与参考实现不一致，合并结果为 \x1b[32m{len(records)}\x1b[0m → \x1b[32m{len(candidate_clusters)}\x1b[0m（参考实现为 \x1b[32m{len(clusters)}\x1b[0m）",
+            file=stderr,
+        )
+    return clusters, keep
+
+
+def merge_all(groups, threshold, engine=heap_merge, jobs=1, max_threshold=None, memo=None, table=None):
+    """对各组同名记录分别进行合并。
+
+    jobs 大于 1 时按代价均衡分批交给进程池，规模大的组优先调度；子进程只返回各记录在组内的下标，
+    由父进程按原顺序重组，因此结果与串行执行完全一致。子进程中距离规则（见 cluster.distance_rules）的统计量
+    随结果一并返回，累加到父进程中。
+
+    给出 max_threshold 时以该阈值执行合并并记录完整的合并序列，再在 threshold 处截断得到结果。
+
+    给出 memo 时，记录指纹（见 memo.fingerprint）命中缓存的组直接复用缓存的结果，其余组合并后写入缓存。
+
+    groups: 记录列表的列表，每个列表为一组同名选手的记录；给出 table 时记录均为 RecordTable 的行号。
+    threshold: 距离阈值。
+    engine: 合并算法，如 heap_merge 或 greedy_merge。
+    jobs: 进程数。
+    max_threshold: 可选，记录合并序列时使用的距离阈值，需不小于 threshold。
+    memo: 可选，memo.MergeMemo 对象，其合并规则摘要应与上述参数对应。
+    table: 可选，记录所在的 RecordTable，子进程通过 fork 共享，无需传递。
+
+    返回值: 与 groups 一一对应的 (clusters, keep, steps) 列表，未给出 max_threshold 时 steps 为 None。
+    """
+
+    def merge_one(records):
+        distance_rules.adapt()
+        if max_threshold is None:
+            position = {record: pos for pos, record in enumerate(records)}
+            clusters, keep = engine(records, threshold, table=table)
+            clusters = [[position[record] for record in cluster] for cluster in clusters]
+            return clusters, [position[record] for record in keep], None
+        steps = []
+        engine(records, max_threshold, steps, table)
+        return *dendrogram.cut(len(records), steps, threshold), steps
+
+    def merge_batch(batch):
+        before = distance_rules.counters()
+        result = [(idx, *merge_one(groups[idx])) for idx in batch]
+        return getpid(), distance_rules.counters(before), result
+
+    def resolve(idx, clusters, keep, steps):
+        records = groups[idx]
+        results[idx] = (
+            [[records[pos] for pos in cluster] for cluster in clusters],
+            [records[pos] for pos in keep],
+            steps,
+        )
+
+    results = [None] * len(groups)
+    if jobs <= 1 and max_threshold is None and memo is None:
+        for idx, records in tqdm(enumerate(groups), total=len(groups)):
+            distance_rules.adapt()
+            results[idx] = *engine(records, threshold, table=table), None
+        return results
+
+    pending = list(range(len(groups)))
+    if memo is not None:
+        fingerprints = [memo_fingerprint(records, table) for records in groups]
+        pending = []
+        for idx, fp in enumerate(fingerprints):
+            if (cached := memo.get(fp)) is None:
+                pending.append(idx)
+            else:
+                resolve(idx, *cached)
+
+    batches = parallel.balanced_batches([len(groups[idx]) ** 2 for idx in pending], jobs * 8)
+    batches = [[pending[pos] for pos in batch] for batch in batches]
+    with tqdm(total=len(pending)) as progress:
+        for pid, counters, result in parallel.imap_unordered(merge_batch, batches, jobs):
+            # 在当前进程中执行的批次已直接计入统计量
+            if pid != getpid():
+                distance_rules.absorb(counters)
+            for idx, clusters, keep, steps in result:
+                resolve(idx, clusters, keep, steps)
+                if memo is not None:
+                    memo.put(fingerprints[idx], clusters, keep, steps)
+            progress.update(len(result))
+    return results
@@ -4,7 +4,9 @@
 import gc
 import re
 import util
+from contest import Contest
 from fractions import Fraction as R
+from school import School
 
 __re_identifier_with_initials__ = re.compile(r"<(\w+)>")
 
@@ -12,11 +14,91 @@ __re_identifier_with_initials__ = re.compile(r"<(\w+)>")
 __clnoi__ = {"金牌": 10, "银牌": 9, "铜牌": 8}
 __clother__ = {"APIO": 500, "CTS": 800, "CTSC": 800, "WC": 600}
 __clscr2lvl__ = [(1000, 10), (500, 9), (250, 8)]
+# NOIP 提高组（CSP-S）与普及组（CSP-J）的评级：[(排名须不超过总人数的几分之一, 等级), ...]，均不满足时为三级
+__clnoip__ = {
+    # 七级：在NOIP提高组复赛（CSP-S第二轮）中成绩列全国前10%；六级：前20%；四级：全国前50%
+    "NOIP": [(10, 7), (5, 6), (2, 4)],
+    "NOIP提高": [(10, 7), (5, 6), (2, 4)],
+    "CSP提高": [(10, 7), (5, 6), (2, 4)],
+    # 五级：在NOIP普及组复赛（CSP-J第二轮）中成绩列全国前20%；四级：全国前50%
+    "NOIP普及": [(5, 5), (2, 4)],
+    "CSP入门": [(5, 5), (2, 4)],
+}
+# 各场比赛的 CCF 评级规则，见 __ccf_rule__
+__ccf_rules__ = {}
+
+
+def __ccf_rule__(contest):
+    """获取一场比赛的 CCF 评级规则，每场比赛只计算一次，因此应在比赛的全部记录读入后调用。
+
+    contest: 比赛。
+
+    返回值: 以下之一：
+    - ("NOI", None)：按奖项评级；
+    - ("rank", [(排名上限, 等级), ...])：排名不超过上限时获得对应等级，均不满足时为三级；
+    - ("score", (B, slope))：第 rank 名的评分为 B - (rank - 1) * slope，同类比赛取最高评分；
+    - (None, None)：不参与评级。
+    """
+
+    rule = __ccf_rules__.get(contest.id)
+    if rule is None:
+        if contest.type == "NOI":
+            rule = ("NOI", None)
+        elif contest.type in __clnoip__:
+            n = contest.capacity if contest.capacity else contest.level_counts["一等奖"] * 5
+            # rank * k <= n 当且仅当 rank <= n // k
+            rule = ("rank", [(n // k, level) for k, level in __clnoip__[contest.type]])
+        elif B := __clother__.get(contest.type, 0):
+            rule = ("score", (B, R(B - 50, contest.n_contestants() - 1)))
+        else:
+            rule = (None, None)
+        __ccf_rules__[contest.id] = rule
+    return rule
+
+
+def __ccf_accumulate__(rule, contest, award, rank, l, scores):
+    """将一条记录计入 CCF 评级。
+
+    rule: 该记录所在比赛的评级规则，见 __ccf_rule__。
+    contest: 该记录所在的比赛。
+    award: 该记录的奖项名称。
+    rank: 该记录的排名。
+    l: 目前的等级。
+    scores: 各类比赛目前的评分，会被修改。
+
+    返回值: 计入该记录后的等级。
+    """
+
+    kind, value = rule
+    if kind == "NOI":
+        return max(l, __clnoi__.get(award, 0))
+    if kind == "rank":
+        for limit, level in value:
+            if rank <= limit:
+                return max(l, level)
+        return max(l, 3)
+    if kind == "score":
+        B, slope = value
+        type = contest.type
+        scores[type] = max(scores.get(type, R(0)), B - (rank - 1) * slope)
+    return l
 
 
 class OIer:
     __all_oiers_list__ = []
     __all_oiers_map__ = {}
+    __slots__ = (
+        "name",
+        "identifier",
+        "gender",
+        "enroll_middle",
+        "uid",
+        "initials",
+        "records",
+        "oierdb_score",
+        "ccf_score",
+        "ccf_level",
+    )
 
     def __init__(self, name, identifier, gender, em, uid):
         self.name = name
@@ -105,17 +187,24 @@ class OIer:
 
         self.records.append(record)
 
-    def compute_oierdb_score(self):
-        "计算该 OIer 的 DB 评分。"
+    def compute_oierdb_score(self, table=None):
+        """计算该 OIer 的 DB 评分。
+
+        table: 可选，记录所在的 RecordTable（见 record_table.py），给出时 records 为其行号。
+        """
 
         s = util.D(0)
-        for record in self.records:
-            dc = util.decay_coefficient(record.contest.year)
-            rc = util.rank_coefficient(record.rank, record.contest.n_contestants(), self.name)
-            tc = util.contest_type_coefficient(record.contest.type, self.name)
-            c = dc * rc * tc
-            record.school.score += c
-            s += c
+        if table is None:
+            for record in self.records:
+                c = util.record_coefficient(record.contest, record.rank, self.name)
+                record.school.score += c
+                s += c
+        else:
+            contests, schools = Contest.get_all(), School.get_all()
+            for idx in self.records:
+                c = util.record_coefficient(contests[table.contest[idx]], table.rank[idx], self.name)
+                schools[table.school[idx]].score += c
+                s += c
         self.oierdb_score = s
 
     def compute_ccf_level(self):
@@ -128,43 +217,53 @@ class OIer:
         scores = {}
         self.records.sort(key=lambda record: record.contest.id)
         for record in self.records:
-            if record.contest.type == "NOI":
-                l = max(l, __clnoi__.get(record.level, 0))
-            elif record.contest.type in ["NOIP", "NOIP提高", "CSP提高"]:
-                n = (
-                    record.contest.capacity
-                    if record.contest.capacity
-                    else record.contest.level_counts["一等奖"] * 5
-                )
-                if record.rank * 10 <= n:  # 七级：在NOIP提高组复赛（CSP-S第二轮）中成绩列全国前10%
-                    l = max(l, 7)
-                elif record.rank * 5 <= n:  # 六级：在NOIP提高组复赛（CSP-S第二轮）中成绩列全国前20%
-                    l = max(l, 6)
-                elif record.rank * 2 <= n:  # 四级：全国前50%
-                    l = max(l, 4)
-                else:  # 三级：进入NOIP复赛（CSP-J/S第二轮）；
-                    l = max(l, 3)
-            elif record.contest.type in ["NOIP普及", "CSP入门"]:
-                n = (
-                    record.contest.capacity
-                    if record.contest.capacity
-                    else record.contest.level_counts["一等奖"] * 5
-                )
-                if record.rank * 5 <= n:  # 五级：在NOIP普及组复赛（CSP-J第二轮）中成绩列全国前20%
-                    l = max(l, 5)
-                elif record.rank * 2 <= n:  # 四级：全国前50%
-                    l = max(l, 4)
-                else:  # 三级：进入NOIP复赛（CSP-J/S第二轮）
-                    l = max(l, 3)
-            elif B := __clother__.get(record.contest.type, 0):
-                n = record.contest.n_contestants()
-                scores.setdefault(record.contest.type, R(0))
-                scores[record.contest.type] = max(
-                    scores[record.contest.type], B - (record.rank - 1) * R(B - 50, n - 1)
-                )
-            score = sum(scores.values())
-            for condition, level in __clscr2lvl__:
-                if score >= condition:
-                    l = max(l, level)
+            contest = record.contest
+            l = __ccf_accumulate__(__ccf_rule__(contest), contest, record.level, record.rank, l, scores)
+        self.__finish_ccf_level__(l, scores)
+
+    def __finish_ccf_level__(self, l, scores):
+        # 各类比赛的评分只增不减，因此只需按最终评分确定评级
+        score = sum(scores.values())
+        for condition, level in __clscr2lvl__:
+            if score >= condition:
+                l = max(l, level)
         self.ccf_score = score
         self.ccf_level = l
+
+    @staticmethod
+    def compute_all_ccf_levels(table=None):
+        """计算所有 OIer 的 CCF 评分及评级，结果与逐个调用 compute_ccf_level 相同。
+
+        按比赛逐场确定各记录的等级与评分，再按 OIer 汇总；各场比赛的分数线只计算一次。
+
+        table: 可选，记录所在的 RecordTable，给出时 records 与 contestants 均为其行号，各字段直接读取表中的列。
+        """
+
+        levels, scores = {}, {}
+        for oier in OIer.get_all():
+            if table is None:
+                oier.records.sort(key=lambda record: record.contest.id)
+            else:
+                oier.records.sort(key=table.contest.__getitem__)
+            levels[oier], scores[oier] = 0, {}
+        for contest in Contest.get_all():
+            if not len(contest.contestants):
+                continue
+            rule = __ccf_rule__(contest)
+            if rule[0] is None:
+                continue
+            if table is None:
+                for record in contest.contestants:
+                    oier = record.oier
+                    levels[oier] = __ccf_accumulate__(
+                        rule, contest, record.level, record.rank, levels[oier], scores[oier]
+                    )
+                continue
+            for idx in contest.contestants.tolist():
+                oier = table.oier[idx]
+                award = table.levels[table.level[idx]]
+                levels[oier] = __ccf_accumulate__(
+                    rule, contest, award, table.rank[idx], levels[oier], scores[oier]
+                )
+        for oier in OIer.get_all():
+            oier.__finish_ccf_level__(levels[oier], scores[oier])
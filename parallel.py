@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import heapq
+import multiprocessing
+from collections import deque
+from sys import stderr
+
+__task__ = None
+
+
+def __run_task__(item):
+    return __task__(item)
+
+
+def balanced_batches(costs, n_batches):
+    """将任务按代价均衡地分为若干批（LPT 贪心）。
+
+    costs: 各任务的代价。
+    n_batches: 批数上限。
+
+    返回值: 批的列表，每批为任务下标的列表；代价大的任务及批次排在前面。
+    """
+
+    order = sorted(range(len(costs)), key=lambda idx: -costs[idx])
+    n_batches = max(1, min(n_batches, len(order)))
+    loads = [(0, k) for k in range(n_batches)]
+    batches = [[] for _ in range(n_batches)]
+    for idx in order:
+        load, k = heapq.heappop(loads)
+        batches[k].append(idx)
+        heapq.heappush(loads, (load + costs[idx], k))
+    totals = dict((k, load) for load, k in loads)
+    return [batches[k] for k in sorted(range(n_batches), key=lambda k: -totals[k]) if batches[k]]
+
+
+def __pool_map__(task, items, jobs, run):
+    """在进程池中对 items 执行 task，jobs 不超过 1 或不支持 fork 时串行执行。
+
+    run: 以 (进程池, items) 为参数、依次产生结果的函数，子进程中执行的函数为 __run_task__。
+    """
+
+    global __task__
+
+    if jobs > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("\x1b[01;33mwarning: \x1b[0m当前平台不支持 fork，回退到串行执行", file=stderr)
+        jobs = 1
+    if jobs <= 1:
+        yield from map(task, items)
+        return
+    __task__ = task
+    try:
+        with multiprocessing.get_context("fork").Pool(jobs) as pool:
+            yield from run(pool, items)
+    finally:
+        __task__ = None
+
+
+def imap_unordered(task, items, jobs):
+    """在 jobs 个子进程中对 items 逐一执行 task，按完成顺序返回结果。
+
+    子进程通过 fork 继承当前进程中的全部数据，因此 task 可以是闭包，也无需序列化 OIer 等对象；
+    不支持 fork 的平台上退化为串行执行。
+
+    task: 任务函数，参数和返回值需可序列化。
+    items: 参数列表。
+    jobs: 进程数。
+    """
+
+    return __pool_map__(task, items, jobs, lambda pool, items: pool.imap_unordered(__run_task__, items))
+
+
+def __windowed__(pool, items, window):
+    "按顺序提交 items，已提交而结果尚未取走的任务不超过 window 个。"
+
+    pending = deque()
+    for item in items:
+        pending.append(pool.apply_async(__run_task__, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def imap(task, items, jobs, window=None):
+    """同 imap_unordered，但按 items 的顺序返回结果。
+
+    items 可以是生成器：只有在已提交而结果尚未取走的任务少于 window 个时才会取下一项，
+    因此调用方处理结果的速度决定了 items 被消耗的速度，不会一次性全部生成并排队。
+    （Pool.imap 的后台线程会尽快取完 items，因此不使用它。）
+
+    task: 任务函数，参数和返回值需可序列化。
+    items: 参数的可迭代对象。
+    jobs: 进程数。
+    window: 可选，同时在途的任务数上限，默认为 jobs 的 2 倍。
+    """
+
+    window = window or 2 * jobs
+    return __pool_map__(task, items, jobs, lambda pool, items: __windowed__(pool, items, window))
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import hashlib
+import io
+import json
+from array import array
+from sys import argv, exit, stderr, stdout
+
+"""
+增量补丁：由上一版本的 result.txt（基准）与本次生成的 result.txt（目标）得到，格式为 JSON：
+{"version": 版本, "base": {"sha512": 摘要, "size": 字节数}, "target": {"sha512": 摘要, "size": 字节数},
+ "added": 新增的 OIer 数, "replaced": 内容变化的 OIer 数, "removed": [删除的 uid, ...], "ops": [操作, ...]}
+
+按顺序执行各操作即得到目标文件的各行：[start, count] 表示复制基准文件中第 start 行起（从 0 开始）的 count 行，
+字符串表示一行新内容（不含换行符，首个字段为 uid，基准中有相同 uid 的行即被替换）。
+只按 uid 维护数据的客户端可以忽略复制操作：用新内容按 uid 替换或新增，再删除 removed 中的 uid 即可。
+
+生成时基准文件逐行读入，每行只保存摘要；目标文件的各行在输出时逐行比对，因此耗时与两文件的行数成线性关系。
+"""
+__version__ = 1
+
+
+def __digest__(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class PatchWriter:
+    """生成 result.txt 的增量补丁，作为 encoder.ResultEncoder.write 的 tap 逐行接收目标文件的内容。"""
+
+    def __init__(self, base, path):
+        """读入基准文件。
+
+        base: 基准 result.txt 的路径。
+        path: 补丁的输出路径。
+        """
+
+        self.path = path
+        self.lines = {}
+        self.uids = array("q")
+        sha512, size = hashlib.sha512(), 0
+        with open(base, "rb") as f:
+            for idx, line in enumerate(f):
+                sha512.update(line)
+                size += len(line)
+                self.lines.setdefault(__digest__(line), idx)
+                self.uids.append(int(line.split(b",", 1)[0]))
+        self.base = {"sha512": sha512.hexdigest(), "size": size}
+        self.seen = bytearray(len(self.uids))
+        self.sha512, self.size = hashlib.sha512(), 0
+        self.ops = []
+        self.literals = []
+
+    def write(self, oier, line):
+        """比对目标文件的一行。
+
+        oier: 该行对应的 OIer，未使用。
+        line: 以换行符结尾的一行。
+        """
+
+        data = line.encode("utf-8")
+        self.sha512.update(data)
+        self.size += len(data)
+        idx = self.lines.get(__digest__(data))
+        if idx is None:
+            self.ops.append(line[:-1])
+            self.literals.append(int(line.split(",", 1)[0]))
+            return
+        self.seen[idx] = 1
+        last = self.ops[-1] if self.ops else None
+        if isinstance(last, list) and last[0] + last[1] == idx:
+            last[1] += 1
+        else:
+            self.ops.append([idx, 1])
+
+    def close(self):
+        """写入补丁。
+
+        返回值: 补丁的摘要信息 (新增数, 替换数, 删除数)。
+        """
+
+        from sink import open_artifact  # 在此导入，使应用补丁的部分不依赖其他模块
+
+        removed = [uid for uid, seen in zip(self.uids, self.seen) if not seen]
+        base_uids = set(self.uids)
+        replaced = sum(uid in base_uids for uid in self.literals)
+        patch = {
+            "version": __version__,
+            "base": self.base,
+            "target": {"sha512": self.sha512.hexdigest(), "size": self.size},
+            "added": len(self.literals) - replaced,
+            "replaced": replaced,
+            # 内容变化的 OIer 不视为删除
+            "removed": sorted(set(removed) - set(self.literals)),
+            "ops": self.ops,
+        }
+        with open_artifact(self.path) as f:
+            json.dump(patch, f, ensure_ascii=False, separators=(",", ":"))
+        return patch["added"], patch["replaced"], len(patch["removed"])
+
+
+def apply(base, patch):
+    """应用补丁。
+
+    base: 基准文件的内容（bytes）。
+    patch: 补丁（已解析的 JSON）。
+
+    返回值: 目标文件的内容（bytes）。
+
+    异常: 基准或结果的摘要与补丁中记录的不一致时抛出 ValueError。
+    """
+
+    if patch.get("version") != __version__:
+        raise ValueError(f"不支持的补丁版本：{patch.get('version')}")
+    if hashlib.sha512(base).hexdigest() != patch["base"]["sha512"]:
+        raise ValueError("基准文件与补丁不匹配")
+    lines = list(io.BytesIO(base))  # 与生成时一样只按 \n 分行
+    output = []
+    for op in patch["ops"]:
+        if isinstance(op, list):
+            output.extend(lines[op[0] : op[0] + op[1]])
+        else:
+            output.append(op.encode("utf-8") + b"\n")
+    result = b"".join(output)
+    if hashlib.sha512(result).hexdigest() != patch["target"]["sha512"]:
+        raise ValueError("应用补丁后的摘要与补丁中记录的不一致")
+    return result
+
+
+def main():
+    """用法: python patch.py <基准 result.txt> <补丁>
+
+    应用补丁，将得到的 result.txt 输出到标准输出。
+    """
+
+    if len(argv) < 3:
+        print(main.__doc__, file=stderr)
+        exit(1)
+    with open(argv[1], "rb") as f:
+        base = f.read()
+    with open(argv[2], encoding="utf-8") as f:
+        patch = json.load(f)
+    stdout.buffer.write(apply(base, patch))
+
+
+if __name__ == "__main__":
+    main()
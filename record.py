@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 
+from functools import reduce
 from itertools import chain
+from operator import or_
 from sys import stderr
 import util
 
@@ -30,6 +32,21 @@ __grades_range__ = {
 
 class Record:
     __auto_increment__ = 0
+    __slots__ = (
+        "id",
+        "oier",
+        "contest",
+        "score",
+        "rank",
+        "level",
+        "grades",
+        "school",
+        "province",
+        "gender",
+        "ems",
+        "ems_mask",
+        "keep_grade_flag",
+    )
 
     def __init__(self, oier, contest, score, rank, level, grades, school, province, gender):
         Record.__auto_increment__ += 1
@@ -44,6 +61,7 @@ class Record:
         self.province = province
         self.gender = gender
         self.ems = util.enrollment_middle(contest, grades)
+        self.ems_mask = util.enrollment_mask(contest, grades)
         self.keep_grade_flag = False
 
     def __repr__(self):
@@ -156,7 +174,7 @@ class Record:
                     return inf
 
                 if a.contest.school_year() == b.contest.school_year():
-                    if len(set(a.ems) & set(b.ems)) == 0:
+                    if not a.ems_mask & b.ems_mask:
                         return inf
 
                     # 在同一年中有不同参赛学校的同类赛事的，不合并
@@ -255,13 +273,17 @@ class Record:
 
         assert len(A) and len(B)
 
-        emsA = set(chain(*[record.ems.keys() for record in A]))
-        emsB = set(chain(*[record.ems.keys() for record in B]))
+        emsA = reduce(or_, (record.ems_mask for record in A))
+        emsB = reduce(or_, (record.ems_mask for record in B))
 
-        if not (len(emsA) == 1 and len(emsB) == 1 and len(A) > 1 and len(B) > 1):
+        def single(mask):
+            # 入学年份唯一即位集中只有一位为 1
+            return mask and mask & (mask - 1) == 0
+
+        if not (single(emsA) and single(emsB) and len(A) > 1 and len(B) > 1):
             return 0
 
-        aem, bem = emsA.pop(), emsB.pop()
+        aem, bem = emsA.bit_length(), emsB.bit_length()
         if abs(aem - bem) != 1:
             return 0
 
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+from array import array
+from collections import Counter
+from contest import Contest
+from record import Record
+from school import School
+import util
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__no_rank__ = -1  # explicit_rank 中表示未显式给出排名，排名不会为负数
+
+
+class RecordTable:
+    """列式存储的比赛记录表，每条记录占用各列中的一个元素，而不是一个 Record 对象。
+
+    解析时通过 append 逐行追加，得到的行号即代表该记录：OIer.records 与 Contest.contestants 中保存的是行号，
+    下游各阶段（合并、评分、CCF 评级、输出）在给出 RecordTable 时按行号直接读取各列。
+    排名在全部追加完成后由 finalize 按比赛分块统一计算。
+
+    记录 ID 为 first_id + 行号，与逐条创建 Record 时一致：使用 RecordTable 期间不应再创建 Record。"""
+
+    def __init__(self):
+        self.first_id = Record.__auto_increment__ + 1
+        self.contest = array("l")
+        self.oier = []  # 合并时会被改写，因此保存对象引用
+        self.score = array("d")  # 空分数记为 NaN
+        self.explicit_rank = array("l")  # 分值中显式给出的排名，未给出时为 __no_rank__（显式给出的 0 名仍为 0）
+        self.rank = array("l")
+        self.level = array("H")
+        self.grades = array("L")
+        self.school = array("l")
+        self.province = array("H")
+        self.gender = array("b")
+        self.keep_grade_flag = bytearray()
+        self.levels, self.level_codes = [], {}
+        self.provinces, self.province_codes = [], {}
+
+    def __len__(self):
+        return len(self.contest)
+
+    @staticmethod
+    def __encode__(value, values, codes):
+        if value not in codes:
+            codes[value] = len(values)
+            values.append(value)
+        return codes[value]
+
+    def append(self, contest, oier, score, level, grades, school, province, gender):
+        """追加一条记录，参数同 Contest.add_contestant。
+
+        返回值: 该记录的行号，排名在 finalize 之后才可用。
+        """
+
+        score, rank = Contest.parse_score(score)
+        return self.append_parsed(contest, oier, score, rank, level, grades, school, province, gender)
+
+    def append_parsed(self, contest, oier, score, rank, level, grades, school, province, gender):
+        """追加一条分值已经解析过的记录，参数同 Contest.add_parsed_contestant。
+
+        返回值: 该记录的行号，排名在 finalize 之后才可用。
+        """
+
+        Record.__auto_increment__ += 1
+        self.contest.append(contest.id)
+        self.oier.append(oier)
+        self.score.append(float("nan") if score is None else score)
+        self.explicit_rank.append(__no_rank__ if rank is None else rank)
+        self.rank.append(0)
+        self.level.append(RecordTable.__encode__(level, self.levels, self.level_codes))
+        self.grades.append(grades)
+        self.school.append(school.id)
+        self.province.append(RecordTable.__encode__(province, self.provinces, self.province_codes))
+        self.gender.append(gender)
+        self.keep_grade_flag.append(0)
+        return len(self.contest) - 1
+
+    def finalize(self):
+        """按比赛分块计算排名，并填充各比赛的 contestants（行号）与 level_counts。
+
+        同一比赛的记录按追加顺序处理，结果与逐条调用 Contest.add_contestant 一致，分数异常的警告也相同。
+        """
+
+        if np is not None:
+            self.__finalize_numpy__()
+            return
+        contests = Contest.get_all()
+        blocks = {}
+        for idx, contest_id in enumerate(self.contest):
+            blocks.setdefault(contest_id, []).append(idx)
+        for contest_id, block in sorted(blocks.items()):
+            contest = contests[contest_id]
+            self.__rank_block__(contest, block)
+            contest.contestants = array("l", block)
+            counts = Counter(self.level[idx] for idx in block)
+            contest.level_counts = Counter({self.levels[code]: count for code, count in counts.items()})
+
+    def __rank_block__(self, contest, block):
+        previous = None
+        for pos, idx in enumerate(block):
+            score, rank = self.score[idx], self.explicit_rank[idx]
+            if rank != __no_rank__:
+                pass
+            elif score != score:
+                rank = pos + 1
+            elif previous is None:
+                contest.check_first_score(score)
+                rank = 1
+            elif score == self.score[previous]:
+                rank = self.rank[previous]
+            else:
+                self.__check_score_order__(contest, idx, previous)
+                rank = pos + 1
+            self.rank[idx] = rank
+            previous = idx
+
+    def __finalize_numpy__(self):
+        """同 finalize：按比赛 ID 稳定排序后整表一次计算排名，每一段分数相同的连续记录取段首的排名，
+        段首的排名为显式排名或其在比赛中的位置；各比赛的 contestants 为排序结果的切片。"""
+
+        n = len(self)
+        if n == 0:
+            return
+        contest = np.frombuffer(self.contest, dtype=f"i{self.contest.itemsize}")
+        order = np.argsort(contest, kind="stable")
+        contest_ids, starts, counts = np.unique(contest[order], return_index=True, return_counts=True)
+        score = np.frombuffer(self.score, dtype=np.float64)[order]
+        explicit = np.frombuffer(self.explicit_rank, dtype=f"i{self.explicit_rank.itemsize}")[order]
+
+        given = explicit != __no_rank__
+        indices = np.arange(n)
+        first = np.zeros(n, dtype=bool)
+        first[starts] = True
+        positions = indices - np.repeat(starts, counts)
+        same = np.zeros(n, dtype=bool)
+        same[1:] = score[1:] == score[:-1]  # NaN 与任何值都不相等
+        same &= ~first
+        start = given | ~same
+        base = np.where(given, explicit, positions + 1)
+        rank = np.frombuffer(self.rank, dtype=f"i{self.rank.itemsize}")
+        rank[order] = base[np.maximum.accumulate(np.where(start, indices, 0))]
+
+        # 只对会输出警告的记录调用检查函数（与逐条检查的判定相同），按比赛与位置的顺序输出
+        contests = Contest.get_all()
+        checked = ~given & ~np.isnan(score) & ~same
+        full_score = np.array([float("inf") if c.full_score is None else c.full_score for c in contests])
+        previous = np.empty(n)
+        previous[0] = 0
+        previous[1:] = score[:-1]
+        warned = checked & np.where(
+            first, score > full_score[contest[order]], np.isnan(previous) | (score > previous)
+        )
+        for pos in np.flatnonzero(warned):
+            contest_ = contests[contest[order[pos]]]
+            if first[pos]:
+                contest_.check_first_score(float(score[pos]))
+            else:
+                self.__check_score_order__(contest_, order[pos], order[pos - 1])
+
+        n_levels = max(len(self.levels), 1)
+        level = np.frombuffer(self.level, dtype=f"u{self.level.itemsize}")
+        level_counts = np.bincount(contest.astype(np.int64) * n_levels + level)
+        for contest_id, begin, count in zip(contest_ids.tolist(), starts.tolist(), counts.tolist()):
+            c = contests[contest_id]
+            c.contestants = order[begin : begin + count]
+            counts_ = level_counts[contest_id * n_levels : (contest_id + 1) * n_levels]
+            c.level_counts = Counter({self.levels[code]: int(k) for code, k in enumerate(counts_) if k})
+
+    def __check_score_order__(self, contest, idx, previous):
+        contest.check_score_order(
+            self.score_of(idx), self.oier[idx].name, self.score_of(previous), self.oier[previous].name
+        )
+
+    def score_of(self, idx):
+        """获取一条记录的分数。
+
+        idx: 行号。
+
+        返回值: 分数，为空时为 None。
+        """
+
+        score = self.score[idx]
+        return None if score != score else score
+
+    def ems_of(self, idx):
+        """获取一条记录可能的初中入学年份，同 Record.ems。
+
+        idx: 行号。
+        """
+
+        return util.enrollment_middle(Contest.get_all()[self.contest[idx]], self.grades[idx])
+
+    def view(self, idx):
+        """获取一条记录的 RecordRow 视图，仅供需要 Record 接口的参考实现（如 merge.greedy_merge）临时使用。
+
+        idx: 行号。
+        """
+
+        return RecordRow(self, idx)
+
+
+class RecordRow:
+    """RecordTable 中一行的视图，接口与 Record 一致；oier 与保留年级标记可写，其余字段只读。"""
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def id(self):
+        return self.table.first_id + self.index
+
+    @property
+    def oier(self):
+        return self.table.oier[self.index]
+
+    @oier.setter
+    def oier(self, oier):
+        self.table.oier[self.index] = oier
+
+    @property
+    def contest(self):
+        return Contest.get_all()[self.table.contest[self.index]]
+
+    @property
+    def score(self):
+        return self.table.score_of(self.index)
+
+    @property
+    def rank(self):
+        return self.table.rank[self.index]
+
+    @property
+    def level(self):
+        return self.table.levels[self.table.level[self.index]]
+
+    @property
+    def grades(self):
+        return self.table.grades[self.index]
+
+    @property
+    def school(self):
+        return School.get_all()[self.table.school[self.index]]
+
+    @property
+    def province(self):
+        return self.table.provinces[self.table.province[self.index]]
+
+    @property
+    def gender(self):
+        return self.table.gender[self.index]
+
+    @property
+    def ems(self):
+        return self.table.ems_of(self.index)
+
+    @property
+    def ems_mask(self):
+        return util.enrollment_mask(self.contest, self.grades)
+
+    @property
+    def keep_grade_flag(self):
+        return bool(self.table.keep_grade_flag[self.index])
+
+    @keep_grade_flag.setter
+    def keep_grade_flag(self, flag):
+        self.table.keep_grade_flag[self.index] = flag
+
+    __repr__ = Record.__repr__
+    to_compress_format = Record.to_compress_format
+    is_keep_grade = Record.is_keep_grade
+    keep_grade = Record.keep_grade
@@ -11,13 +11,15 @@ class School:
     __school_name_map__ = {}
     __school_name_map_by_province__ = {}
     __schools_by_pc__ = {}
+    # baike_cache、x、y 仅在合并学校时按需填充
+    __slots__ = ("id", "name", "province", "city", "aliases", "score", "baike_cache", "x", "y")
 
     def __init__(self, idx, name, province, city, aliases):
         self.id = idx
         self.name = name
         self.province = province
         self.city = city
-        self.aliases = aliases
+        self.aliases = tuple(aliases)
         self.score = util.D(0)
 
     @staticmethod
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+from contest import Contest
+from oier import OIer
+import util
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+"""
+批量计算 DB 评分：将全部比赛记录展开为（OIer、学校、比赛、排名）四列，以浮点数按比赛查表得到每条记录的系数，
+再按 OIer 与学校分组求和，代替逐条记录的 Decimal 运算。
+
+排名系数直接取自 util.rc_list，衰变系数与比赛类型系数取自 util.contest_coefficient；
+修改 util.rank_coefficient 后批量结果将与 OIer.compute_oierdb_score 不一致，可用 --verify-scoring 检查。
+"""
+# 评分保留的小数位数：浮点求和的误差远小于该精度，舍入后精确值相等的评分（如并列的选手）也相等，排序时不会错位
+__digits__ = 6
+
+
+def __collect__(oiers, table=None):
+    """按 OIer 顺序展开全部比赛记录。
+
+    table: 可选，记录所在的 RecordTable（见 record_table.py），给出时各列按行号直接从表中读取。
+
+    返回值: (OIer 下标, 学校 ID, 比赛 ID, 排名) 四列，以及各比赛第一条记录的 OIer 姓名（用于输出警告）。
+    给出 table 且 NumPy 可用时各列为 NumPy 数组，否则为列表。
+    """
+
+    names = {}
+    if table is None:
+        owners, schools, contests, ranks = [], [], [], []
+        for idx, oier in enumerate(oiers):
+            for record in oier.records:
+                names.setdefault(record.contest.id, oier.name)
+                owners.append(idx)
+                schools.append(record.school.id)
+                contests.append(record.contest.id)
+                ranks.append(record.rank)
+        return (owners, schools, contests, ranks), names
+
+    owners, rows = [], []
+    for idx, oier in enumerate(oiers):
+        owners.extend([idx] * len(oier.records))
+        rows.extend(oier.records)
+    if np is not None:
+        rows = np.array(rows, dtype=np.int64)
+        columns = [
+            np.frombuffer(column, dtype=f"i{column.itemsize}")[rows].astype(np.int64)
+            for column in (table.school, table.contest, table.rank)
+        ]
+        owners = np.array(owners, dtype=np.int64)
+    else:
+        columns = [[column[idx] for idx in rows] for column in (table.school, table.contest, table.rank)]
+    schools, contests, ranks = columns
+    if np is not None:
+        # 各比赛第一条记录的位置，按位置排序以保持与逐条展开时相同的比赛顺序
+        for pos in np.sort(np.unique(contests, return_index=True)[1]).tolist():
+            names[int(contests[pos])] = oiers[owners[pos]].name
+    else:
+        for owner, contest_id in zip(owners, contests):
+            if contest_id not in names:
+                names[contest_id] = oiers[owner].name
+    return (owners, schools, contests, ranks), names
+
+
+def __contest_tables__(names):
+    """获取各比赛的 (衰变系数, 选手总数, 比赛类型系数)，系数转为浮点数，以比赛 ID 为键。
+
+    names: __collect__ 返回的各比赛第一条记录的 OIer 姓名，按其中的比赛顺序计算。
+    """
+
+    all_contests = Contest.get_all()
+    tables = {}
+    for contest_id in names:
+        dc, total, tc = util.contest_coefficient(all_contests[contest_id], names[contest_id])
+        tables[contest_id] = (float(dc), total, float(tc))
+    return tables
+
+
+def compute_scores(oiers, n_schools, table=None):
+    """批量计算 DB 评分，不修改任何 OIer 或学校。
+
+    oiers: OIer 列表，记录应已按比赛 ID 排序（见 OIer.compute_ccf_level），以使求和顺序与逐条计算一致。
+    n_schools: 学校总数。
+    table: 可选，记录所在的 RecordTable，见 __collect__。
+
+    返回值: (OIer 评分列表, 学校评分列表)，均为保留 __digits__ 位小数的浮点数，学校评分以学校 ID 为下标。
+    """
+
+    (owners, schools, contests, ranks), names = __collect__(oiers, table)
+    tables = __contest_tables__(names)
+    rc_list = [float(rc) for rc in util.rc_list]
+
+    if np is None:
+        # 排名越界的记录极少，交给 rank_coefficient 输出与逐条计算相同的警告
+        for idx, (contest_id, rank) in enumerate(zip(contests, ranks)):
+            total = tables[contest_id][1]
+            if not (1 <= rank <= total):
+                util.rank_coefficient(rank, total, oiers[owners[idx]].name)
+        oier_scores, school_scores = [0.0] * len(oiers), [0.0] * n_schools
+        for owner, school, contest_id, rank in zip(owners, schools, contests, ranks):
+            dc, total, tc = tables[contest_id]
+            c = dc * rc_list[400 * max(min(rank, total), 1) // total] * tc
+            oier_scores[owner] += c
+            school_scores[school] += c
+        return __round__(oier_scores), __round__(school_scores)
+
+    size = max(tables) + 1 if tables else 0
+    dc, total, tc = np.zeros(size), np.ones(size, dtype=np.int64), np.zeros(size)
+    for contest_id, (d, n, t) in tables.items():
+        dc[contest_id], total[contest_id], tc[contest_id] = d, n, t
+    contest_ids = np.asarray(contests, dtype=np.int64)
+    ranks = np.asarray(ranks, dtype=np.int64)
+    totals = total[contest_ids]
+    for idx in np.flatnonzero((ranks < 1) | (ranks > totals)):
+        util.rank_coefficient(int(ranks[idx]), int(totals[idx]), oiers[owners[idx]].name)
+    rank_index = 400 * np.clip(ranks, 1, totals) // totals
+    c = dc[contest_ids] * np.array(rc_list)[rank_index] * tc[contest_ids]
+    # bincount 按输入顺序累加，与逐条累加的顺序相同
+    oier_scores = np.bincount(np.asarray(owners, dtype=np.int64), weights=c, minlength=len(oiers))
+    school_scores = np.bincount(np.asarray(schools, dtype=np.int64), weights=c, minlength=n_schools)
+    return __round__(oier_scores.tolist()), __round__(school_scores.tolist())
+
+
+def __round__(scores):
+    return [round(score, __digits__) for score in scores]
+
+
+def assign_scores(oiers, schools, table=None):
+    """批量计算 DB 评分并写入各 OIer 的 oierdb_score 与各学校的 score。
+
+    oiers: OIer 列表。
+    schools: 全部学校的列表，以学校 ID 为下标。
+    table: 可选，记录所在的 RecordTable，见 __collect__。
+    """
+
+    oier_scores, school_scores = compute_scores(oiers, len(schools), table)
+    for oier, score in zip(oiers, oier_scores):
+        oier.oierdb_score = score
+    for school, score in zip(schools, school_scores):
+        school.score = score
+
+
+def verify_scores(oiers, schools, table=None):
+    """将批量计算的 DB 评分与已由 OIer.compute_oierdb_score 算出的 Decimal 评分比较。
+
+    比较的是输出中可见的部分：result.txt 中格式化后的 OIer 评分与按评分排序的顺序，以及 school.json 中的学校评分。
+
+    oiers: OIer 列表。
+    schools: 全部学校的列表，以学校 ID 为下标。
+    table: 可选，记录所在的 RecordTable，见 __collect__。
+
+    返回值: 不一致之处的说明列表，一致时为空。
+    """
+
+    oier_scores, school_scores = compute_scores(oiers, len(schools), table)
+    errors = []
+    for oier, score in zip(oiers, oier_scores):
+        expected, actual = OIer.__float2p_format__(oier.oierdb_score), OIer.__float2p_format__(score)
+        if expected != actual:
+            errors.append(f"OIer {oier.uid} ({oier.name}) 的评分 {expected} 被计算为 {actual}")
+    expected = sorted(range(len(oiers)), key=lambda idx: (-oiers[idx].oierdb_score, oiers[idx].uid))
+    actual = sorted(range(len(oiers)), key=lambda idx: (-oier_scores[idx], oiers[idx].uid))
+    for pos, (i, j) in enumerate(zip(expected, actual)):
+        if i != j:
+            errors.append(f"按评分排序的第 {pos + 1} 位 OIer {oiers[i].uid} 被排为 {oiers[j].uid}")
+            break
+    for school, score in zip(schools, school_scores):
+        expected, actual = float(round(school.score, 2)), float(round(score, 2))
+        if expected != actual:
+            errors.append(f"学校 {school.name} 的评分 {expected} 被计算为 {actual}")
+    return errors
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import hashlib
+import json
+import os
+from sink import open_artifact
+
+"""
+分片输出：dist/result.txt 的各行按姓名分到固定数量的分片中，每个分片以内容摘要命名（dist/result/<摘要前 16 位>.txt），
+内容不变的分片在多次生成之间文件名不变，镜像与缓存只需传输变化的分片。
+
+分片清单 dist/result.manifest.json 的格式为：
+{"version": 版本, "shards": 分片数, "key": 分片方式,
+ "files": [{"shard": 分片编号, "file": 相对路径, "sha512": 摘要, "size": 字节数, "lines": 行数}, ...]}
+分片编号为姓名 UTF-8 编码的 BLAKE2b（8 字节，大端序）摘要对分片数取模；同一分片内各行保持 result.txt 中的顺序（按 DB 评分排序）。
+"""
+__version__ = 1
+
+
+def shard_of(name, shards):
+    """获取姓名所在的分片编号。
+
+    name: 姓名。
+    shards: 分片数。
+    """
+
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "big") % shards
+
+
+class ShardWriter:
+    """将编码好的各行写入分片，关闭时按内容摘要重命名各分片并写入分片清单。"""
+
+    def __init__(self, directory, manifest, shards):
+        if not isinstance(shards, int) or shards <= 0:
+            raise ValueError(f"分片数须为正整数：\x1b[32m{shards!r}\x1b[0m")
+        self.directory = directory
+        self.manifest = manifest
+        self.shards = shards
+        self.files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, oier, line):
+        """写入一行。
+
+        oier: 该行对应的 OIer。
+        line: 以换行符结尾的一行。
+        """
+
+        shard = shard_of(oier.name, self.shards)
+        entry = self.files.get(shard)
+        if entry is None:
+            path = os.path.join(self.directory, f".{shard}.tmp")
+            entry = self.files[shard] = [open(path, "wb"), path, hashlib.sha512(), 0, 0]
+        data = line.encode("utf-8")
+        entry[0].write(data)
+        entry[2].update(data)
+        entry[3] += len(data)
+        entry[4] += 1
+
+    def close(self):
+        """重命名各分片，删除不再使用的旧分片，并写入分片清单。
+
+        返回值: 分片清单。
+        """
+
+        files, names = [], set()
+        for shard in sorted(self.files):
+            f, path, sha512, size, lines = self.files[shard]
+            f.close()
+            sha512 = sha512.hexdigest()
+            name = f"{sha512[:16]}.txt"
+            os.replace(path, os.path.join(self.directory, name))
+            names.add(name)
+            files.append(
+                {
+                    "shard": shard,
+                    "file": f"{os.path.basename(self.directory)}/{name}",
+                    "sha512": sha512,
+                    "size": size,
+                    "lines": lines,
+                }
+            )
+        for name in os.listdir(self.directory):
+            if name not in names:
+                os.remove(os.path.join(self.directory, name))
+        manifest = {"version": __version__, "shards": self.shards, "key": "blake2b-64(name)", "files": files}
+        with open_artifact(self.manifest) as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+        return manifest
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import zlib
+from contextlib import contextmanager
+from sys import stderr
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+"""
+dist 目录中的产物均通过 open_artifact 写入：写入的同时计算 SHA-512 与字节数，
+写入完成后生成同名的信息文件（如 dist/result.txt 对应 dist/result.info.json），格式为 {"sha512": 摘要, "size": 字节数}。
+
+给出预压缩格式时，同时生成 dist/result.txt.gz 等压缩版本，各版本的摘要与字节数记录在信息文件的 "variants" 中，
+如 {"sha512": ..., "size": ..., "variants": {"gz": {"sha512": ..., "size": ...}, ...}}。
+"""
+__buffer_size__ = 1 << 20
+
+
+def __gzip__():
+    # wbits=31 生成 gzip 格式，文件头中不含文件名与修改时间，因此输出是确定的
+    c = zlib.compressobj(9, zlib.DEFLATED, 31)
+    return c.compress, c.flush
+
+
+def __brotli__():
+    c = brotli.Compressor(quality=11)
+    return c.process, c.finish
+
+
+def __zstd__():
+    # 19 级是窗口不超过 8 MiB 的最高压缩级别，更高的级别浏览器可能拒绝解压
+    c = zstandard.ZstdCompressor(level=19).compressobj()
+    return c.compress, c.flush
+
+
+# 预压缩格式：后缀 → (所需模块, 创建压缩器的函数)，压缩器为 (compress, flush) 两个函数
+__compressors__ = {
+    "gz": (zlib, __gzip__),
+    "br": (brotli, __brotli__),
+    "zst": (zstandard, __zstd__),
+}
+
+
+def precompress_variants():
+    """获取可用的预压缩格式，缺少 brotli 或 zstandard 模块时跳过对应的格式。
+
+    返回值: 后缀列表。
+    """
+
+    variants = []
+    for suffix, (module, _) in __compressors__.items():
+        if module is None:
+            print(f"\x1b[01;33mwarning: \x1b[0m缺少压缩模块，不生成 \x1b[0;32m'.{suffix}'\x1b[0m 版本", file=stderr)
+        else:
+            variants.append(suffix)
+    return variants
+
+
+def info_path(path):
+    """获取产物对应的信息文件路径：dist/result.txt、dist/static.json 等文本产物去掉扩展名，
+    其余产物保留扩展名（如 dist/result.bin 对应 dist/result.bin.info.json），以免与同名的文本产物冲突。
+
+    path: 产物路径。
+    """
+
+    root, ext = os.path.splitext(path)
+    return (root if ext in (".txt", ".json") else path) + ".info.json"
+
+
+class CompressedVariant(threading.Thread):
+    """在后台线程中生成产物的一个压缩版本，并计算压缩结果的 SHA-512 与字节数。
+
+    压缩与写入均在该线程中进行（zlib、brotli、zstandard 压缩时会释放 GIL），因此各版本与原文件的写入并行；
+    队列长度有限，压缩跟不上时写入方会等待，内存占用不会随文件大小增长。"""
+
+    def __init__(self, path, suffix):
+        super().__init__(daemon=True)
+        self.path = f"{path}.{suffix}"
+        self.compress, self.flush = __compressors__[suffix][1]()
+        self.queue = queue.Queue(maxsize=16)
+        self.sha512 = hashlib.sha512()
+        self.size = 0
+        self.error = None
+        self.start()
+
+    def __write__(self, f, data):
+        f.write(data)
+        self.sha512.update(data)
+        self.size += len(data)
+
+    def run(self):
+        try:
+            with open(self.path, "wb") as f:
+                while (data := self.queue.get()) is not None:
+                    self.__write__(f, self.compress(data))
+                self.__write__(f, self.flush())
+        except Exception as e:
+            self.error = e
+            # 继续取走数据，以免写入方阻塞
+            while self.queue.get() is not None:
+                pass
+
+    def info(self):
+        "获取压缩版本的信息。"
+
+        return {"sha512": self.sha512.hexdigest(), "size": self.size}
+
+
+class ArtifactSink(io.RawIOBase):
+    """写入文件并同时计算 SHA-512 与字节数的底层流，一般通过 open_artifact 使用。"""
+
+    def __init__(self, path, variants=()):
+        self.path = path
+        self.file = open(path, "wb")
+        self.sha512 = hashlib.sha512()
+        self.size = 0
+        self.variants = {suffix: CompressedVariant(path, suffix) for suffix in variants}
+        # 删除上次生成、本次不再生成的压缩版本，以免与新的产物不一致
+        for suffix in __compressors__:
+            if suffix not in self.variants and os.path.exists(f"{path}.{suffix}"):
+                os.remove(f"{path}.{suffix}")
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.file.write(data)
+        self.sha512.update(data)
+        self.size += len(data)
+        if self.variants:
+            data = bytes(data)  # 缓冲区会被复用，交给其他线程前需要复制
+            for variant in self.variants.values():
+                variant.queue.put(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+            for variant in self.variants.values():
+                variant.queue.put(None)
+            for variant in self.variants.values():
+                variant.join()
+                if variant.error is not None:
+                    raise variant.error
+        super().close()
+
+    def info(self):
+        "获取产物信息。"
+
+        info = {"sha512": self.sha512.hexdigest(), "size": self.size}
+        if self.variants:
+            info["variants"] = {suffix: variant.info() for suffix, variant in self.variants.items()}
+        return info
+
+    def write_info(self):
+        "写入信息文件。"
+
+        with open(info_path(self.path), "w", newline="\n", encoding="utf-8") as f:
+            print(json.dumps(self.info(), separators=(",", ":")), file=f)
+
+
+@contextmanager
+def open_artifact(path, binary=False, variants=()):
+    """打开 dist 中的产物用于写入，正常关闭后写入信息文件；写入过程中出错时不生成信息文件。
+
+    path: 产物路径。
+    binary: 是否以二进制方式写入，否则以 UTF-8 文本方式写入，换行符为 \\n。
+    variants: 同时生成的预压缩格式，见 precompress_variants。
+
+    返回值: 可写入的文件对象。
+    """
+
+    sink = ArtifactSink(path, variants)
+    stream = io.BufferedWriter(sink, __buffer_size__)
+    if not binary:
+        stream = io.TextIOWrapper(stream, encoding="utf-8", newline="\n")
+    with stream:
+        yield stream
+    sink.write_info()
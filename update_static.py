@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 
-import hashlib
 import json
 from pathlib import Path
+from sink import open_artifact, precompress_variants
+from sys import argv
 
 
 def main():
-    """将静态 JSON 文件合并并生成相应的信息文件。"""
+    """将静态 JSON 文件合并并生成相应的信息文件，给出 --precompress 时同时生成预压缩版本。"""
 
     output = {}
 
@@ -24,22 +25,13 @@ def main():
         with open(school_file, "r", encoding="utf-8") as f:
             output["schools"] = json.load(f)
 
-    output_str = json.dumps(output, ensure_ascii=False, separators=(",", ":"))
-
     dist_dir = Path("dist")
     dist_dir.mkdir(exist_ok=True)
 
-    with open(dist_dir / "static.json", "w", encoding="utf-8") as f:
-        f.write(output_str)
-
-    output_bytes = output_str.encode("utf-8")
-    sha512_hash = hashlib.sha512(output_bytes).hexdigest()
-    file_size = len(output_bytes)
-
-    info_data = {"sha512": sha512_hash, "size": file_size}
-
-    with open(dist_dir / "static.info.json", "w", encoding="utf-8") as f:
-        json.dump(info_data, f, ensure_ascii=False, separators=(",", ":"))
+    # 直接写入产物，SHA-512 与大小在写入的同时计算
+    variants = precompress_variants() if "--precompress" in argv else ()
+    with open_artifact(str(dist_dir / "static.json"), variants=variants) as f:
+        json.dump(output, f, ensure_ascii=False, separators=(",", ":"))
 
     if school_file.exists():
         school_file.unlink()
@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: UTF-8 -*-
 
+import gc
+import mmap
+import os
+import sys
 from collections import Counter
+from contextlib import contextmanager
 from decimal import Decimal as D, getcontext
 from itertools import chain
-from sys import stderr
+from sys import argv, platform, stderr
+from tqdm import tqdm
+from types import MappingProxyType
 
 getcontext().prec = 64
 
@@ -61,12 +68,98 @@ award_levels = [
 ]
 
 
+def get_option(name, default=None):
+    """获取命令行选项的值，支持 --name=value 与 --name value 两种写法。
+
+    name: 选项名，如 --jobs。
+    default: 未指定该选项时的默认值。
+    """
+
+    for idx, arg in enumerate(argv):
+        if arg == name and idx + 1 < len(argv):
+            return argv[idx + 1]
+        if arg.startswith(name + "="):
+            return arg[len(name) + 1 :]
+    return default
+
+
+def read_lines(path):
+    """逐行读取 UTF-8 文本文件，不将整个文件读入内存。
+
+    普通文件通过内存映射读取，进度条按已读取的字节数显示；"-" 表示标准输入，此时总大小未知。
+
+    path: 文件路径，"-" 表示标准输入。
+
+    返回值: 生成器，依次产生 (行号, 行)，行号从 1 开始，行不含行尾换行符。
+    """
+
+    if path == "-":
+        yield from __read_stream__(sys.stdin.buffer, None)
+        return
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:  # 空文件无法映射
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from __read_stream__(mm, size)
+
+
+def __read_stream__(stream, total, step=1 << 16):
+    """逐行读取二进制流并解码。
+
+    stream: 支持 readline 的二进制流。
+    total: 总字节数，未知时为 None。
+    step: 每读取这么多字节更新一次进度条。
+    """
+
+    with tqdm(total=total, unit="B", unit_scale=True) as progress:
+        pending = 0
+        for lineno, raw in enumerate(iter(stream.readline, b""), 1):
+            pending += len(raw)
+            if pending >= step:
+                progress.update(pending)
+                pending = 0
+            yield lineno, raw.decode("utf-8").rstrip("\r\n")
+        progress.update(pending)
+
+
+@contextmanager
+def gc_suspended():
+    """在 with 语句块内暂停分代垃圾回收，用于批量创建大量对象，避免回收器反复扫描新建的对象。"""
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def peak_memory():
+    """获取内存占用峰值。
+
+    返回值: (当前进程, 已结束的子进程中的最大值)，单位为 MiB；不支持的平台上返回 None。
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    # macOS 上 ru_maxrss 的单位为字节，Linux 上为 KiB
+    unit = 1024 * 1024 if platform == "darwin" else 1024
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit,
+    )
+
+
 def __main__():
     import json
     import pypinyin
     from contest import Contest
 
-    global add_contestant, contests, contest_type_coefficient, decay_coefficient, enrollment_middle, get_contest_id, get_grades, get_initials, get_mode, get_weighted_mode, lcs, rank_coefficient
+    global add_contestant, contest_coefficient, contests, contest_type_coefficient, decay_coefficient, enrollment_mask, enrollment_middle, get_contest_id, get_grades, get_initials, get_mode, get_weighted_mode, lcs, rank_coefficient, rc_list, record_coefficient
 
     with open("static/contests.json", encoding="utf-8") as f:
         for contest in json.load(f):
@@ -141,24 +234,51 @@ def __main__():
             else:
                 raise ValueError(f"未知的年级：\x1b[032m'{grade_name}'\x1b[0m")
 
+    # 各 (学年, 可能年级) 对应的入学年份表，为所有记录共享；位集以 ems_base 年为第 0 位
+    ems_base = 1900
+    ems_tables = {}
+    ems_modes = {}
+
+    def enrollment_table(contest, grades):
+        key = (contest.school_year(), grades)
+        if key not in ems_tables:
+            year = key[0]
+            mask = grades
+            is_primary_or_none = grades == 4290837504  # "小学/无" 中小学优先级比大学高
+            ems = {}
+            while mask:
+                grade = (mask & -mask).bit_length() - 16
+                ems[year - grade + 1] = 1 if is_primary_or_none and grade > 5 else 2
+                mask &= mask - 1
+            table = MappingProxyType(ems)
+            ems_tables[key] = table, sum(1 << (em - ems_base) for em in ems)
+            if ems:
+                most = max(ems.values())
+                ems_modes[id(table)] = sorted(k for k, v in ems.items() if v == most)
+        return ems_tables[key]
+
     def enrollment_middle(contest, grades):
         """获取初中入学年份列表。
 
         contest: 比赛对象。
         grades: 所有可能的年级列表。
 
-        返回值: dict，表示所有可能的入学年份列表，值表示优先级。
+        返回值: 只读的 dict，表示所有可能的入学年份列表，值表示优先级；相同学年与年级的记录共享同一对象。
         """
 
-        year = contest.school_year()
-        mask = grades
-        is_primary_or_none = grades == 4290837504  # "小学/无" 中小学优先级比大学高
-        ems = {}
-        while mask:
-            grade = (mask & -mask).bit_length() - 16
-            ems[year - grade + 1] = 1 if is_primary_or_none and grade > 5 else 2
-            mask &= mask - 1
-        return ems
+        return enrollment_table(contest, grades)[0]
+
+    def enrollment_mask(contest, grades):
+        """获取初中入学年份位集。
+
+        contest: 比赛对象。
+        grades: 所有可能的年级列表。
+
+        返回值: 整数，第 i 位为 1 表示 ems_base + i 年是可能的入学年份。两个位集按位与为 0 即入学年份不相交，
+        位集只有一位为 1 时两个位集最低位的下标之差即入学年份之差。
+        """
+
+        return enrollment_table(contest, grades)[1]
 
     def get_mode(sets):
         """获取最佳初中入学年份。
@@ -180,6 +300,9 @@ def __main__():
         返回值: 最佳入学年份的列表。
         """
 
+        # 单个共享的入学年份表直接使用预先计算的结果
+        if len(dicts) == 1 and id(dicts[0]) in ems_modes:
+            return ems_modes[id(dicts[0])][:]
         counter = Counter()
         for d in dicts:
             counter.update(d)
@@ -229,6 +352,44 @@ def __main__():
             )
         return D(scoring.get(type, "0"))
 
+    contest_coefficients = {}
+
+    def contest_coefficient(contest, name=None):
+        """获取一场比赛的衰变系数、选手总数与比赛类型系数。
+
+        结果在每场比赛第一次用到时计算并缓存，因此未知比赛类型的警告对每场比赛只输出一次。
+
+        contest: 比赛。
+        name: 姓名，用于输出错误信息。
+
+        返回值: (decay_coefficient, n_contestants, contest_type_coefficient)。
+        """
+
+        entry = contest_coefficients.get(contest.id)
+        if entry is None:
+            entry = contest_coefficients[contest.id] = (
+                decay_coefficient(contest.year),
+                contest.n_contestants(),
+                contest_type_coefficient(contest.type, name),
+            )
+        return entry
+
+    def record_coefficient(contest, rank, name=None):
+        """获取一条比赛记录的 DB 评分系数，即 decay_coefficient、rank_coefficient 与 contest_type_coefficient 之积。
+
+        比赛相关的系数见 contest_coefficient，每条记录只需查表并计算排名系数，
+        乘法顺序与逐个调用时相同，因此结果完全一致。
+
+        contest: 比赛。
+        rank: 当前排名。
+        name: 姓名，用于输出错误信息。
+
+        返回值: 系数，Decimal 类型。
+        """
+
+        dc, total, tc = contest_coefficient(contest, name)
+        return dc * rank_coefficient(rank, total, name) * tc
+
     def lcs(str1, str2):
         """求字符串 str1 和 str2 的最长公共子序列。"""
 